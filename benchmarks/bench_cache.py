@@ -0,0 +1,106 @@
+"""
+bench_cache
+Benchmark the warm container cache against the fake backends: the api calls & wall time of a cold
+invocation versus warm invocations of the same function container. Also checks that cached entries
+expire after their ttl, and that the handler rebuilds the signer, clients & credentials and re-runs
+the invocation once where the cached credentials are rejected (401).
+
+   $ python benchmarks/bench_cache.py --invocations 5 --latency 0.05
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import fakes
+import simulator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oke-autoscaler"))
+import func
+
+def check_ttl_expiry():
+   """
+   check_ttl_expiry
+   Cached entries must be reloaded once they outlive the ttl for their kind, as configured by cache_ttl_<kind>.
+   """
+   loads = []
+   os.environ['cache_ttl_secret'] = "1"
+   try:
+      func.invalidate_cache()
+      for i in range(2):
+         assert func.get_cached('secret:bench', 'secret', lambda: loads.append(1) or len(loads)) == 1
+      time.sleep(1.1)
+      assert func.get_cached('secret:bench', 'secret', lambda: loads.append(1) or len(loads)) == 2
+      # an expired entry of another key is dropped on the next miss..
+      time.sleep(1.1)
+      func.get_cached('shapes:bench', 'shapes', lambda: [])
+      assert 'secret:bench' not in func.cache
+   finally:
+      del os.environ['cache_ttl_secret']
+      func.invalidate_cache()
+
+   # a zero ttl reloads the kubeconfig on each invocation..
+   for ttl, kubeconfig_calls in [(None, 1), ("0", 2)]:
+      config = {'cache_ttl_kubeconfig': ttl} if ttl is not None else {}
+      report = simulator.simulate(simulator.burst_trace(minutes=6), 3, config)
+      assert report['api-calls-by-operation']['container_engine.create_kubeconfig'] == kubeconfig_calls, report['api-calls-by-operation']
+
+def check_auth_invalidation():
+   """
+   check_auth_invalidation
+   Where an api call is rejected with 401, the handler must discard the cache, rebuild the signer and
+   re-run the invocation once - and only once, including in multi node pool mode.
+   """
+   signers = []
+   saved_signer = func.oci.auth.signers.get_resource_principals_signer
+   func.oci.auth.signers.get_resource_principals_signer = lambda: signers.append(object()) or signers[-1]
+   try:
+      for statuses, expected_status, expected_signers, config in [([401], 200, 2, {}), ([401, 401], None, 2, {}),
+                                                                  ([401], 200, 2, {'node_pools': json.dumps([{}])})]:
+         signers.clear()
+         cluster = fakes.FakeCluster(scripted_failures={'container_engine.get_node_pool': statuses})
+         cluster.set_replicas(8)
+         cluster.advance(3)
+         with simulator.simulated_function(cluster, config):
+            ctx = fakes.FakeContext()
+            try:
+               # the handler returns the JSON encoded result as a JSON string..
+               result_dict = json.loads(json.loads(func.handler(ctx).response_data))
+            except func.oci.exceptions.ServiceError as e:
+               # rejected again after the rebuild, the error is raised to the fdk..
+               assert e.status == 401
+               result_dict = None
+         assert len(signers) == expected_signers, len(signers)
+         assert cluster.api_calls['container_engine.get_node_pool'] == len(statuses) + (expected_status is not None)
+         if expected_status is not None:
+            assert ctx.status_code == expected_status, ctx.status_code
+            # in multi node pool mode, the node pools are re-evaluated with the rebuilt signer..
+            result_data = result_dict['node-pools'][0] if 'node-pools' in result_dict else result_dict
+            assert 'success' in result_data, result_dict
+   finally:
+      func.oci.auth.signers.get_resource_principals_signer = saved_signer
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark cold versus warm invocations of the function container.")
+   parser.add_argument('--invocations', type=int, default=5, help="invocations of the same function container")
+   parser.add_argument('--latency', type=float, default=0.05, help="seconds of latency injected into each api call")
+   args = parser.parse_args()
+
+   check_ttl_expiry()
+   check_auth_invalidation()
+
+   cluster = fakes.FakeCluster(latency=args.latency)
+   cluster.set_replicas(8)
+   print("invocation  api-calls  cache-hits  cache-misses  wall-time(s)")
+   with simulator.simulated_function(cluster):
+      for invocation in range(args.invocations):
+         cluster.advance(3)
+         api_calls = cluster.api_call_count()
+         func.cache_stats.update(hits=0, misses=0)
+         start = time.monotonic()
+         result_dict = json.loads(func.do(None))
+         print("%10d  %9d  %10d  %12d  %12.3f" % (invocation, cluster.api_call_count() - api_calls, result_dict['cache']['hits'],
+                                                 result_dict['cache']['misses'], time.monotonic() - start))
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,90 @@
+"""
+bench_daemon
+Benchmark daemon mode against the kubernetes api server stand-in's pod watch: the decision latency, from
+unschedulable pods appearing to the scale-up decision, by debounce period. Also checks the index of
+unschedulable pods maintained from the watch events, and that the daemon returns promptly when stopped.
+
+   $ python benchmarks/bench_daemon.py --debounce 0.2 1 2
+"""
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+import fakes
+import simulator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oke-autoscaler"))
+import func
+
+def check_unsched_index():
+   """
+   check_unsched_index
+   Watch events must add & remove unschedulable pods from the index, reporting new pressure only where
+   a node pool's entry was empty.
+   """
+   cluster = fakes.FakeCluster(node_count=0)
+   cluster.set_replicas(2)
+   pods = [cluster.pod_json(pod) for pod in cluster.pods.values()]
+   index = {}
+   assert func.update_unsched_index(index, "ADDED", pods[0]) == "pool1"
+   assert func.update_unsched_index(index, "ADDED", pods[1]) is None
+   assert func.update_unsched_index(index, "MODIFIED", pods[1]) is None and len(index['pool1']) == 2
+   # scheduled, then deleted..
+   scheduled_pod = dict(pods[0], status={'phase': "Running"})
+   assert func.update_unsched_index(index, "MODIFIED", scheduled_pod) is None and len(index['pool1']) == 1
+   assert func.update_unsched_index(index, "DELETED", pods[1]) is None and not index['pool1']
+   assert func.update_unsched_index(index, "ADDED", pods[1]) == "pool1"
+
+def check_decision_latency(debounce):
+   """
+   check_decision_latency
+   Unschedulable pods appearing in the watch must lead to a scale-up decision within the debounce period
+   (plus the evaluation), and the daemon must return promptly when stopped. Returns the decision latency,
+   the time from the pods' creation to the decision & the time taken to stop.
+   """
+   cluster = fakes.FakeCluster()
+   cluster.set_replicas(10)
+   cluster.advance(3)
+   results = queue.Queue()
+   stop = threading.Event()
+   config = {'daemon_debounce': str(debounce), 'daemon_eval_interval': "3600", 'daemon_watch_timeout': "2"}
+   with simulator.simulated_function(cluster, config):
+      daemon = threading.Thread(target=func.run_daemon, args=(None, stop, lambda result_dict, latency: results.put((time.monotonic(), result_dict, latency))))
+      daemon.start()
+      try:
+         # the scheduled evaluation on start..
+         decided, result_dict, latency = results.get(timeout=10)
+         assert 'success' in result_dict and latency is None, result_dict
+
+         # unschedulable pods appear..
+         created = time.monotonic()
+         cluster.set_replicas(30)
+         decided, result_dict, latency = results.get(timeout=debounce + 5)
+         assert result_dict['success']['action'] == "scale-up", result_dict
+         assert latency is not None and debounce <= latency <= decided - created, (latency, decided - created)
+         assert decided - created < debounce + 1, decided - created
+      finally:
+         stopped = time.monotonic()
+         stop.set()
+         daemon.join(5)
+      stop_time = time.monotonic() - stopped
+      assert not daemon.is_alive() and stop_time < 1, stop_time
+
+   return latency, decided - created, stop_time
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark daemon mode decision latency.")
+   parser.add_argument('--debounce', type=float, nargs='+', default=[0.2, 1, 2], help="daemon_debounce values, in seconds")
+   args = parser.parse_args()
+
+   check_unsched_index()
+
+   print("debounce(s)  decision-latency(s)  pods-to-decision(s)  stop(s)")
+   for debounce in args.debounce:
+      latency, pods_to_decision, stop_time = check_decision_latency(debounce)
+      print("%11.1f  %19.3f  %19.3f  %7.3f" % (debounce, latency, pods_to_decision, stop_time))
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,168 @@
+"""
+bench_drain
+Benchmark node drains against the kubernetes api server stand-in: the wall time & api calls taken to
+cordon a node and evict its pods, by eviction concurrency. Also checks that a drain failing part way -
+through an eviction or wait failure, or the invocation deadline - returns the node to service, and that
+a multi node scale-down returns to service each node not deleted, reporting the nodes which failed, and
+that drains leave time before the invocation deadline to delete or uncordon the node.
+
+   $ python benchmarks/bench_drain.py --pods 40 --concurrency 1 4 8 --latency 0.02
+"""
+import os
+import sys
+import json
+import time
+import urllib.error
+import argparse
+import fakes
+import simulator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oke-autoscaler"))
+import func
+
+def drained_cluster(pods, **cluster_options):
+   """
+   drained_cluster
+   A cluster with pods scheduled to its first node, and a kubernetes api server stand-in.
+   Returns the cluster, the server, the kube api & the first node.
+   """
+   cluster = fakes.FakeCluster(**cluster_options)
+   cluster.set_replicas(pods)
+   cluster.advance(1)
+   server, kube_server = fakes.start_kube_api_server(cluster)
+   kube_api = {'server': kube_server, 'token': "fake", 'ssl_context': None}
+
+   return cluster, server, kube_api, cluster.nodes[0]
+
+def drain(pods, deadline=None, timeout=None, **cluster_options):
+   """
+   drain
+   Drain the first node of a cluster with pods, within the invocation deadline (seconds from now), set
+   from the invocation's timeout. Returns the drain outcome (or the exception raised), the node & the cluster.
+   """
+   cluster, server, kube_api, node = drained_cluster(pods, **cluster_options)
+   func.set_deadline(time.monotonic() + deadline if deadline is not None else None, timeout)
+   try:
+      drain_outcome = func.drain_node(kube_api, node['private_ip'], 0, 30, 4)
+   except Exception as e:
+      drain_outcome = e
+   finally:
+      func.set_deadline(None)
+      server.shutdown()
+      server.server_close()
+
+   return drain_outcome, node, cluster
+
+def check_drain_failures():
+   """
+   check_drain_failures
+   A drain failing part way must not raise from the eviction of a pod, and must uncordon the node
+   unless it is drained - including where the pod listing fails or runs into the invocation deadline.
+   """
+   # drained, the node remains cordoned..
+   drain_outcome, node, cluster = drain(4)
+   assert drain_outcome['status'] == "drained" and len(drain_outcome['evicted']) == 4, drain_outcome
+   assert node['unschedulable']
+
+   for scripted_failures in [{'kubernetes.get': [None, 503]}, {'kubernetes.post': [500]}, {'kubernetes.post': [None, None, 403]}]:
+      drain_outcome, node, cluster = drain(4, scripted_failures=scripted_failures)
+      assert drain_outcome['status'] == "failed" and len(drain_outcome['failed']) == 1, (scripted_failures, drain_outcome)
+      assert len(drain_outcome['evicted']) == 3, (scripted_failures, drain_outcome)
+      assert not node['unschedulable'], scripted_failures
+
+   # the pod listing fails..
+   drain_outcome, node, cluster = drain(4, scripted_failures={'kubernetes.get': [503]})
+   assert isinstance(drain_outcome, urllib.error.HTTPError) and drain_outcome.code == 503, drain_outcome
+   assert not node['unschedulable']
+   assert len(cluster.pods) == 4 and cluster.evictions == 0
+
+   # the pod listing is cut short by the invocation deadline, after the cordon..
+   drain_outcome, node, cluster = drain(4, deadline=0.7, latency=0.5)
+   assert isinstance(drain_outcome, func.DeadlineExceeded), drain_outcome
+   assert not node['unschedulable']
+   assert cluster.api_calls['kubernetes.patch'] == 2, cluster.api_calls
+
+def check_drain_deadline(timeout=10, deadline=3.5):
+   """
+   check_drain_deadline
+   A drain must end drain_deadline_reserve of the invocation's timeout before the invocation deadline, leaving
+   time to delete or uncordon the node - here with an eviction blocked by a PodDisruptionBudget.
+   """
+   start = time.monotonic()
+   drain_outcome, node, cluster = drain(2, deadline=deadline, timeout=timeout, pdb_max_unavailable=1)
+   elapsed = time.monotonic() - start
+   assert drain_outcome['status'] == "failed" and len(drain_outcome['blocked']) == 1, drain_outcome
+   assert elapsed <= deadline - func.drain_deadline_reserve * timeout, elapsed
+   assert not node['unschedulable']
+
+def scale_down(scripted_failures):
+   """
+   scale_down
+   Invoke the function against a cluster of 4 lightly loaded nodes, each running a single pod, removing
+   up to 3 nodes in a single step. Returns the result (or the exception raised), the state saved & the cluster.
+   """
+   cluster = fakes.FakeCluster(node_count=4, pod_cpu=3, usage_ratio=0.2, scripted_failures=scripted_failures)
+   cluster.set_replicas(4)
+   cluster.advance(3)
+   with simulator.simulated_function(cluster, {'node_pool_eval_cpu_load': "90", 'node_pool_scale_down_max_step': "3"}):
+      try:
+         result_dict = json.loads(func.do(None))
+      except Exception as e:
+         result_dict = e
+      state = func.load_state(func.get_state_store(None, os.environ['state_store']), cluster.node_pool_id)
+
+   return result_dict, state, cluster
+
+def check_step_failures():
+   """
+   check_step_failures
+   A multi node scale-down must delete the nodes drained, record the deletions submitted and report the
+   nodes which failed to drain or be deleted - and must leave none of the nodes not deleted cordoned,
+   including where the cordon of the selected nodes fails.
+   """
+   for scripted_failures, deleted, drain_failed, delete_failed in [({}, 3, 0, 0),
+                                                                   ({'kubernetes.post': [500]}, 2, 1, 0),
+                                                                   ({'container_engine.delete_node': [None, 400]}, 2, 0, 1),
+                                                                   ({'kubernetes.patch': [None, 503]}, 0, 0, 0)]:
+      result_dict, state, cluster = scale_down(scripted_failures)
+      case = (scripted_failures, result_dict)
+      if deleted:
+         result_data = result_dict['success']
+         assert result_data['action'] == "scale-down" and len(result_data['nodes']) == deleted, case
+         assert len(result_data['drain-failed-nodes']) == drain_failed and len(result_data['delete-failed-nodes']) == delete_failed, case
+         assert result_data['node-count'] == str(4 - deleted), case
+         assert state['work_request_ids'] == result_data['work-request-ids'] and len(state['work_request_ids']) == deleted, (case, state)
+      else:
+         # the cordon failed, before any node was drained..
+         assert isinstance(result_dict, urllib.error.HTTPError) and result_dict.code == 503, case
+         assert cluster.evictions == 0 and 'container_engine.delete_node' not in cluster.api_calls, case
+      assert len([node for node in cluster.nodes if node['lifecycle_state'] == "DELETING"]) == deleted, case
+      assert not [node['name'] for node in cluster.live_nodes() if node['lifecycle_state'] == "ACTIVE" and node['unschedulable']], case
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark node drains by eviction concurrency.")
+   parser.add_argument('--pods', type=int, default=40, help="pods on the drained node")
+   parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8], help="node_drain_concurrency values")
+   parser.add_argument('--latency', type=float, default=0.02, help="seconds of latency injected into each api call")
+   args = parser.parse_args()
+
+   check_drain_failures()
+   check_step_failures()
+   check_drain_deadline()
+
+   print("concurrency  status   evicted  api-calls  wall-time(s)")
+   for concurrency in args.concurrency:
+      cluster, server, kube_api, node = drained_cluster(args.pods, node_ocpus=16, node_memory_in_gbs=128, pod_cpu=0.1,
+                                                        pod_memory=512 * 1024 ** 2, latency=args.latency)
+      try:
+         start = time.monotonic()
+         drain_outcome = func.drain_node(kube_api, node['private_ip'], 0, 90, concurrency)
+         wall_time = time.monotonic() - start
+      finally:
+         server.shutdown()
+         server.server_close()
+      print("%11d  %-7s  %7d  %9d  %12.3f" % (concurrency, drain_outcome['status'], len(drain_outcome['evicted']),
+                                              cluster.api_call_count(), wall_time))
+
+if __name__ == "__main__":
+   main()
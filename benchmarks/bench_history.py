@@ -0,0 +1,129 @@
+"""
+bench_history
+Benchmark the node metrics history against a fake Monitoring client: the monitoring api calls &
+datapoints fetched per invocation when updating the history incrementally, versus re-querying the
+whole window, and the memory & persisted size of the history for large node pools. Also checks that
+gaps in the metric data are not read as stale samples, and that deleted nodes are evicted.
+
+   $ python benchmarks/bench_history.py --nodes 100 250 500 --window 60 1440
+"""
+import os
+import sys
+import math
+import argparse
+import tempfile
+import datetime
+import fakes
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oke-autoscaler"))
+import func
+
+def history_memory(metrics_history):
+   """
+   history_memory
+   Returns the memory used by the history's sample buffers, in bytes.
+   """
+   return sum(sys.getsizeof(node_history['cpu']) + sys.getsizeof(node_history['ram']) for node_history in metrics_history['nodes'].values())
+
+def fake_pool(node_count):
+   """
+   fake_pool
+   Returns a fake cluster with node_count busy nodes, and its node ids.
+   """
+   cluster = fakes.FakeCluster(node_count=node_count)
+   cluster.set_replicas(node_count * 4)
+   return cluster, [node['id'] for node in cluster.nodes]
+
+def check_gaps():
+   """
+   check_gaps
+   Samples missing from the metric data must be read as gaps, not as the samples recorded a window ago.
+   """
+   window = 10
+   node_history = {'last': None, 'cpu': func.array.array('f', [math.nan]) * window, 'ram': func.array.array('f', [math.nan]) * window}
+   for minute in range(100, 110):
+      func.record_metric_sample(node_history, window, 'cpu', minute, 90.0)
+   # 5 minute gap, then a single sample..
+   func.record_metric_sample(node_history, window, 'cpu', 115, 10.0)
+   assert func.get_metric_statistic(node_history, window, 'cpu', 115, 10, "mean") == (90.0 * 4 + 10.0) / 5
+   assert func.get_metric_statistic(node_history, window, 'cpu', 115, 1, "mean") == 10.0
+   assert func.get_metric_statistic(node_history, window, 'cpu', 115, 10, "p50") == 90.0
+   # a gap longer than the window leaves only the new sample..
+   func.record_metric_sample(node_history, window, 'cpu', 200, 20.0)
+   assert func.get_metric_statistic(node_history, window, 'cpu', 200, 10, "mean") == 20.0
+   # no samples in the window..
+   assert func.get_metric_statistic(node_history, window, 'cpu', 230, 10, "mean") is None
+   # samples older than the window are ignored..
+   func.record_metric_sample(node_history, window, 'cpu', 150, 99.0)
+   assert func.get_metric_statistic(node_history, window, 'cpu', 200, 10, "mean") == 20.0
+
+def check_eviction(cluster, node_ids, window):
+   """
+   check_eviction
+   Nodes removed from the node pool must be evicted from the history, including once persisted.
+   """
+   monitoring_client = fakes.FakeMonitoringClient(cluster)
+   state_store = {'backend': "file", 'directory': tempfile.mkdtemp(prefix="oke-autoscaler-bench-")}
+   metrics_history = func.load_metrics_history(state_store, cluster.node_pool_id, window)
+   func.update_metrics_history(monitoring_client, cluster.compartment_id, metrics_history, node_ids, cluster.now, 50)
+   func.save_metrics_history(state_store, cluster.node_pool_id, metrics_history)
+   cluster.advance(1)
+   metrics_history = func.load_metrics_history(state_store, cluster.node_pool_id, window)
+   func.update_metrics_history(monitoring_client, cluster.compartment_id, metrics_history, node_ids[1:], cluster.now, 50)
+   func.save_metrics_history(state_store, cluster.node_pool_id, metrics_history)
+   metrics_history = func.load_metrics_history(state_store, cluster.node_pool_id, window)
+   assert sorted(metrics_history['nodes']) == sorted(node_ids[1:])
+   # the persisted samples are retained..
+   now_minute = func.epoch_minute(cluster.now)
+   assert func.get_metric_statistic(metrics_history['nodes'][node_ids[1]], window, 'cpu', now_minute, window, "mean") is not None
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark incremental node metrics history updates.")
+   parser.add_argument('--nodes', type=int, nargs='+', default=[100, 250, 500], help="node pool sizes")
+   parser.add_argument('--window', type=int, nargs='+', default=[60, 1440], help="history windows, in minutes")
+   parser.add_argument('--interval', type=int, default=3, help="minutes between invocations")
+   parser.add_argument('--batch-size', type=int, default=50, help="monitoring batch size")
+   args = parser.parse_args()
+
+   check_gaps()
+   cluster, node_ids = fake_pool(3)
+   cluster.advance(10)
+   check_eviction(cluster, node_ids, 10)
+
+   print("nodes  window  path         api-calls  datapoints  memory(KiB)  persisted(KiB)")
+   for node_count in args.nodes:
+      for window in args.window:
+         cluster, node_ids = fake_pool(node_count)
+         cluster.advance(window + args.interval)
+         monitoring_client = fakes.FakeMonitoringClient(cluster)
+         state_store = {'backend': "file", 'directory': tempfile.mkdtemp(prefix="oke-autoscaler-bench-")}
+         time_then = cluster.now - datetime.timedelta(minutes=args.interval)
+
+         # prime the history, then measure a single incremental update..
+         metrics_history = func.load_metrics_history(state_store, cluster.node_pool_id, window)
+         func.update_metrics_history(monitoring_client, cluster.compartment_id, metrics_history, node_ids, time_then, args.batch_size)
+         func.save_metrics_history(state_store, cluster.node_pool_id, metrics_history)
+         api_calls = cluster.api_call_count()
+         metrics_history = func.load_metrics_history(state_store, cluster.node_pool_id, window)
+         incremental_calls = func.update_metrics_history(monitoring_client, cluster.compartment_id, metrics_history, node_ids, cluster.now, args.batch_size)
+         assert incremental_calls == cluster.api_call_count() - api_calls
+         func.save_metrics_history(state_store, cluster.node_pool_id, metrics_history)
+         persisted = os.path.getsize(os.path.join(state_store['directory'], cluster.node_pool_id + ".metrics.json"))
+         incremental_datapoints = 2 * node_count * (args.interval + func.metrics_history_refetch)
+
+         # versus re-querying the whole window, at 1 minute resolution..
+         query_start_time = (cluster.now - datetime.timedelta(minutes=window)).isoformat()
+         full_calls = 0
+         full_datapoints = 0
+         for metric in ["CpuUtilization", "MemoryUtilization"]:
+            nodes_datapoints, metric_api_calls = func.get_nodes_metric_datapoints(monitoring_client, cluster.compartment_id, "oci_computeagent", metric, node_ids, "1m",
+                                                                                  query_start_time, cluster.now.isoformat(), "1m", args.batch_size)
+            full_calls += metric_api_calls
+            full_datapoints += sum(len(datapoints) for datapoints in nodes_datapoints.values())
+
+         print("%5d  %6d  %-11s  %9d  %10d" % (node_count, window, "full-window", full_calls, full_datapoints))
+         print("%5d  %6d  %-11s  %9d  %10d  %11.1f  %14.1f" % (node_count, window, "incremental", incremental_calls, incremental_datapoints,
+                                                             history_memory(metrics_history) / 1024.0, persisted / 1024.0))
+
+if __name__ == "__main__":
+   main()
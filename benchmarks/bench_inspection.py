@@ -0,0 +1,83 @@
+"""
+bench_inspection
+Benchmark node inspection (instance details & cpu/ram utilization) against latency-injecting fake
+Compute & Monitoring clients: the original sequential per-node path (one get_instance and two
+monitoring queries per node) versus the batched, concurrent inspect_nodes stage. The clients are got
+through get_client, so that each call is made through call_api - with the default rate limit, unless
+set by --rate-limit.
+
+   $ python benchmarks/bench_inspection.py --latency 0.05 --nodes 10 40 100
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import fakes
+import oci
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oke-autoscaler"))
+import func
+
+def inspect_nodes_sequential(compute_client, monitoring_client, compartment_id, nodes, monitoring_resolution, query_start_time, query_end_time, query_resolution):
+   """
+   inspect_nodes_sequential
+   The original node inspection loop: one get_instance and two monitoring queries per node, in turn.
+   """
+   nodes_data = {}
+   for i in range(len(nodes)):
+      if (nodes[i]['lifecycle_state']) != "DELETED":
+         node_id = (nodes[i]['id'])
+         instance = json.loads(str(func.evaluate_node(compute_client, node_id).data))
+         node_load = {}
+         for metric in ["CpuUtilization", "MemoryUtilization"]:
+            query = metric + "[" + monitoring_resolution + "]{resourceId=" + node_id + "}.mean()"
+            monitoring_response = func.summarize_metrics_data(monitoring_client, compartment_id, "oci_computeagent", query, query_start_time, query_end_time, query_resolution)
+            node_load[metric] = json.loads(str(monitoring_response.data))[0]['aggregated_datapoints'][0]['value']
+         nodes_data[i] = {'name': nodes[i]['private_ip'], 'id': node_id, 'created': instance['time_created'],
+                          'cpu_load': node_load["CpuUtilization"], 'ram_load': node_load["MemoryUtilization"]}
+
+   return nodes_data
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark sequential versus concurrent node inspection.")
+   parser.add_argument('--latency', type=float, default=0.05, help="seconds of latency injected into each OCI api call")
+   parser.add_argument('--nodes', type=int, nargs='+', default=[10, 40, 100], help="node pool sizes")
+   parser.add_argument('--concurrency', type=int, default=8, help="inspect_nodes concurrency")
+   parser.add_argument('--batch-size', type=int, default=50, help="inspect_nodes monitoring batch size")
+   parser.add_argument('--rate-limit', type=float, default=None, help="api_rate_limit, in calls per second (0 for no limit)")
+   args = parser.parse_args()
+
+   if args.rate_limit is not None:
+      os.environ['api_rate_limit'] = str(args.rate_limit)
+
+   print("nodes  path        api-calls  wall-time(s)")
+   for node_count in args.nodes:
+      cluster = fakes.FakeCluster(node_count=node_count, latency=args.latency)
+      cluster.set_replicas(node_count * 4)
+      cluster.advance(5)
+      clients = {'ComputeClient': fakes.FakeComputeClient(cluster), 'MonitoringClient': fakes.FakeMonitoringClient(cluster)}
+      func.create_client = lambda signer, client_class, **kwargs: clients[client_class.__name__]
+      func.invalidate_cache()
+      compute_client = func.get_client(None, oci.core.ComputeClient)
+      monitoring_client = func.get_client(None, oci.monitoring.MonitoringClient)
+      nodes = [{'id': node['id'], 'private_ip': node['private_ip'], 'lifecycle_state': node['lifecycle_state']} for node in cluster.nodes]
+      query_end_time = cluster.now.isoformat()
+      query_start_time = (cluster.now - fakes.datetime.timedelta(minutes=3)).isoformat()
+
+      results = {}
+      for path in ["sequential", "concurrent"]:
+         # each path starting with a full token bucket..
+         func.rate_limiters.clear()
+         api_calls = cluster.api_call_count()
+         start = time.monotonic()
+         if path == "sequential":
+            results[path] = inspect_nodes_sequential(compute_client, monitoring_client, cluster.compartment_id, nodes, "3m", query_start_time, query_end_time, "3m")
+         else:
+            results[path] = func.inspect_nodes(compute_client, monitoring_client, cluster.compartment_id, nodes, "3m", query_start_time, query_end_time, "3m",
+                                               args.batch_size, args.concurrency)
+         print("%5d  %-10s  %9d  %12.3f" % (node_count, path, cluster.api_call_count() - api_calls, time.monotonic() - start))
+      assert results["sequential"] == results["concurrent"], "inspection results differ"
+
+if __name__ == "__main__":
+   main()
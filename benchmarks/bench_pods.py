@@ -0,0 +1,97 @@
+"""
+bench_pods
+Benchmark the listing of unschedulable pods against the kubernetes api server stand-in: the wall time &
+pages requested to find the unschedulable pods of a node pool among running pods, by page size. Also
+checks that the listing follows the continue token across pages, and filters the Pending pods on the
+Unschedulable condition & nodeSelector name.
+
+   $ python benchmarks/bench_pods.py --pending 1000 5000 --page-size 100 500
+"""
+import os
+import sys
+import time
+import argparse
+import fakes
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oke-autoscaler"))
+import func
+
+def pods_cluster(running, pending, latency=0.0):
+   """
+   pods_cluster
+   A cluster with running pods, and a mix of pending pods: unschedulable pods of the node pool (pool1)
+   & of another node pool (pool2), and pods of the node pool pending for another reason. Returns the
+   cluster, the server & the kube api.
+   """
+   cluster = fakes.FakeCluster(node_count=max(running // 7 + 1, 1), latency=latency)
+   cluster.set_replicas(running)
+   cluster.advance(1)
+   with cluster.lock:
+      for i in range(pending):
+         if i % 3 == 0:
+            cluster.new_pod()
+         elif i % 3 == 1:
+            cluster.new_pod(node_pool_name="pool2")
+         else:
+            cluster.new_pod(pending_reason="ContainersNotReady")
+   server, kube_server = fakes.start_kube_api_server(cluster)
+   kube_api = {'server': kube_server, 'token': "fake", 'ssl_context': None}
+
+   return cluster, server, kube_api
+
+def check_unsched_pods(running=20, pending=25, page_size=4):
+   """
+   check_unsched_pods
+   Only the Pending pods must be requested, a page of page_size pods at a time until the continue token
+   is exhausted, and only the Unschedulable pods of the node pool (or of any node pool) returned.
+   """
+   cluster, server, kube_api = pods_cluster(running, pending)
+   try:
+      with cluster.lock:
+         pending_pods = [cluster.pod_json(pod) for pod in cluster.pending_pods()]
+      assert len(pending_pods) == pending and len(cluster.pods) == running + pending
+      unsched_names = [pod['metadata']['name'] for pod in pending_pods if pod['status']['conditions'][0]['reason'] == "Unschedulable"]
+      pool_names = [pod['metadata']['name'] for pod in pending_pods if pod['metadata']['name'] in unsched_names and pod['spec']['nodeSelector']['name'] == "pool1"]
+      for node_pool_name, expected_names in [("pool1", pool_names), ("pool2", [name for name in unsched_names if name not in pool_names]), (None, unsched_names)]:
+         api_calls = cluster.api_calls.get('kubernetes.get', 0)
+         unsched_pods = func.get_unsched_pods(kube_api, node_pool_name, page_size)
+         assert sorted(pod['metadata']['name'] for pod in unsched_pods) == sorted(expected_names), (node_pool_name, unsched_pods)
+         assert cluster.api_calls['kubernetes.get'] - api_calls == -(-pending // page_size), cluster.api_calls
+
+      # the pages of pods, as listed..
+      pages = list(func.list_pending_pods(kube_api, page_size))
+      assert [len(pod_list['items']) for pod_list in pages] == [page_size] * (pending // page_size) + [pending % page_size], pages
+      assert [pod['metadata']['name'] for pod_list in pages for pod in pod_list['items']] == [pod['metadata']['name'] for pod in pending_pods]
+
+      # the pending pods within a single page, without a continue token..
+      pages = list(func.list_pods(kube_api, 'status.phase=Pending', 500))
+      assert len(pages) == 1 and len(pages[0]['items']) == pending and not pages[0]['metadata']['continue'], pages
+   finally:
+      server.shutdown()
+      server.server_close()
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark the listing of unschedulable pods.")
+   parser.add_argument('--running', type=int, default=2000, help="running pods")
+   parser.add_argument('--pending', type=int, nargs='+', default=[1000, 5000], help="pending pods")
+   parser.add_argument('--page-size', type=int, nargs='+', default=[100, 500], help="pods per page")
+   parser.add_argument('--latency', type=float, default=0.02, help="seconds of latency injected into each api call")
+   args = parser.parse_args()
+
+   check_unsched_pods()
+
+   print("pending  page-size  pages  unschedulable  wall-time(s)")
+   for pending in args.pending:
+      cluster, server, kube_api = pods_cluster(args.running, pending, args.latency)
+      try:
+         for page_size in args.page_size:
+            api_calls = cluster.api_call_count()
+            start = time.monotonic()
+            unsched_pods = func.get_unsched_pods(kube_api, "pool1", page_size)
+            print("%7d  %9d  %5d  %13d  %12.3f" % (pending, page_size, cluster.api_call_count() - api_calls, len(unsched_pods), time.monotonic() - start))
+      finally:
+         server.shutdown()
+         server.server_close()
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,144 @@
+"""
+bench_retries
+Benchmark the oci api client layer against fake clients returning scripted throttling (429) & failure
+(5xx) sequences: the invocations failed, api calls & retries made and scaling outcome of a burst trace,
+with retries disabled versus enabled. Also checks the per-service token bucket rate, that only the api
+calls actually sent are counted, and that slow api calls are cut short by the invocation deadline,
+returning a no-action result within the function timeout - or within the deadline of the invoke context.
+
+   $ python benchmarks/bench_retries.py
+   $ python benchmarks/bench_retries.py --retries 0 2 4 --base-delay 0.05
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import fakes
+import simulator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oke-autoscaler"))
+import func
+
+# scripted statuses of successive calls, by operation (None is a successful call)..
+scenarios = [("none", {}, 0.0),
+             ("monitoring-throttled", {'monitoring.summarize_metrics_data': [429, 429, 429]}, 0.0),
+             ("node-pool-unavailable", {'container_engine.get_node_pool': [503, 503, None] * 20}, 0.0),
+             ("scale-up-throttled", {'container_engine.update_node_pool': [429, 429]}, 0.0),
+             ("delete-node-failed", {'container_engine.delete_node': [503]}, 0.0),
+             ("throttled-5%", {}, 0.05)]
+
+def check_token_bucket(rate=20, burst=10, calls=40):
+   """
+   check_token_bucket
+   Calls beyond the bucket's capacity of burst calls must wait for the bucket to refill, at rate calls per second.
+   """
+   os.environ.update(api_rate_limit=str(rate), api_rate_burst=str(burst))
+   func.rate_limiters.clear()
+   try:
+      start = time.monotonic()
+      for call in range(calls):
+         func.acquire_rate_limit("bench")
+      elapsed = time.monotonic() - start
+   finally:
+      del os.environ['api_rate_limit'], os.environ['api_rate_burst']
+      func.rate_limiters.clear()
+   expected = (calls - burst) / rate
+   assert expected * 0.9 <= elapsed <= expected + 0.5, elapsed
+
+   return elapsed
+
+def check_call_counting():
+   """
+   check_call_counting
+   The api calls & retries recorded must be the attempts sent, not the calls refused by the rate limit
+   or the deadline before being sent.
+   """
+   cluster = fakes.FakeCluster(scripted_failures={'container_engine.get_node_pool': [429, 429]})
+   client = fakes.FakeContainerEngineClient(cluster, None)
+   os.environ.update(api_rate_limit="2", api_rate_burst="2", api_retry_base_delay="0.01")
+   func.rate_limiters.clear()
+   func.reset_timings()
+   try:
+      # two throttled attempts, then sent once more within the bucket's capacity..
+      func.call_api(client, "container_engine", "get_node_pool", cluster.node_pool_id)
+      # the bucket's refill, then the deadline, would be exceeded first..
+      for deadline in [0.2, -1]:
+         func.set_deadline(time.monotonic() + deadline)
+         try:
+            func.call_api(client, "container_engine", "get_node_pool", cluster.node_pool_id)
+            assert False, "call sent after the deadline"
+         except func.DeadlineExceeded:
+            pass
+         finally:
+            func.set_deadline(None)
+      timings = func.get_timings(0)
+   finally:
+      del os.environ['api_rate_limit'], os.environ['api_rate_burst'], os.environ['api_retry_base_delay']
+      func.rate_limiters.clear()
+   assert cluster.api_calls['container_engine.get_node_pool'] == 3, cluster.api_calls
+   assert timings['api-calls'] == {'container_engine': 1} and timings['retries'] == {'container_engine': 2}, timings
+
+def check_deadline(function_timeout=2, latency=0.3):
+   """
+   check_deadline
+   With slow api calls, invocations must return within the function timeout - those cut short with a
+   deadline-exceeded no-action result.
+   """
+   report = simulator.simulate(simulator.burst_trace(start=3, duration=6, minutes=12), 3, {'function_timeout': str(function_timeout)},
+                               {'latency': latency})
+   assert report['failed-invocations'] == 0
+   assert report['results-by-reason'].get('deadline-exceeded'), report['results-by-reason']
+   assert report['wall-time-per-invocation']['max'] < function_timeout, report['wall-time-per-invocation']
+
+   return report['wall-time-per-invocation']['max']
+
+def check_handler_deadline(timeout=2, latency=0.3):
+   """
+   check_handler_deadline
+   The handler must take the invocation deadline from the invoke context, rather than the function_timeout
+   configured: with slow api calls, the invocation is cut short with a deadline-exceeded no-action result
+   within the context's timeout.
+   """
+   cluster = fakes.FakeCluster(latency=latency)
+   cluster.set_replicas(8)
+   cluster.advance(3)
+   saved_signer = func.oci.auth.signers.get_resource_principals_signer
+   func.oci.auth.signers.get_resource_principals_signer = lambda: None
+   try:
+      with simulator.simulated_function(cluster, {'function_timeout': "120"}):
+         ctx = fakes.FakeContext(timeout)
+         start = time.monotonic()
+         # the handler returns the JSON encoded result as a JSON string..
+         result_dict = json.loads(json.loads(func.handler(ctx).response_data))
+         wall_time = time.monotonic() - start
+   finally:
+      func.oci.auth.signers.get_resource_principals_signer = saved_signer
+   assert result_dict['warning']['reason'] == 'deadline-exceeded', result_dict
+   # a fake oci api call in flight is not cut to the time remaining..
+   assert wall_time < timeout + latency, wall_time
+
+   return wall_time
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark oci api retries against scripted throttling & failures.")
+   parser.add_argument('--retries', type=int, nargs='+', default=[0, 4], help="api_max_retries values")
+   parser.add_argument('--base-delay', type=float, default=0.01, help="api_retry_base_delay, in seconds")
+   args = parser.parse_args()
+
+   print("token bucket: %.2fs for 40 calls at 20 calls/s, after a burst of 10" % check_token_bucket())
+   check_call_counting()
+   print("deadline: %.2fs max invocation wall time, 2s function timeout" % check_deadline())
+   print("deadline: %.2fs handler wall time, 2s invoke context deadline, 120s function timeout" % check_handler_deadline())
+
+   print("scenario               retries  failed  api-calls  api-retries  decisions  final-nodes")
+   for name, scripted_failures, failure_rate in scenarios:
+      for api_max_retries in args.retries:
+         report = simulator.simulate(simulator.burst_trace(), 3,
+                                     {'api_max_retries': str(api_max_retries), 'api_retry_base_delay': str(args.base_delay)},
+                                     {'scripted_failures': scripted_failures, 'failure_rate': failure_rate, 'failure_status': 429})
+         print("%-21s  %7d  %6d  %9d  %11d  %9d  %11d" % (name, api_max_retries, report['failed-invocations'], report['api-calls'],
+                                                         report['api-retries'], len(report['decisions']), report['final-node-count']))
+
+if __name__ == "__main__":
+   main()
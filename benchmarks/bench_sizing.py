@@ -0,0 +1,174 @@
+"""
+bench_sizing
+Benchmark scale-up sizing over synthetic sets of unschedulable pods: the time taken to read the pod
+requests & bin-pack them onto the node shape, and the number of nodes required. Also checks the
+quantity parsing, pod requests, bin packing & node shape capacity against known node counts.
+
+   $ python benchmarks/bench_sizing.py --pods 100 1000 5000 10000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import fakes
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oke-autoscaler"))
+import func
+
+def synthetic_pods(count, seed=0):
+   """
+   synthetic_pods
+   Generate unschedulable pods with a mix of cpu & memory requests, some with multiple or init containers.
+   """
+   rng = random.Random(seed)
+   pods = []
+   for i in range(count):
+      containers = [{'name': "c" + str(c), 'resources': {'requests': {'cpu': rng.choice(["50m", "100m", "250m", "500m", "1", "2"]),
+                                                                       'memory': rng.choice(["64Mi", "256Mi", "512Mi", "1Gi", "2Gi", "4G"])}}}
+                    for c in range(rng.choice([1, 1, 1, 2, 3]))]
+      spec = {'nodeSelector': {'name': "pool1"}, 'containers': containers}
+      if rng.random() < 0.1:
+         spec['initContainers'] = [{'name': "init", 'resources': {'requests': {'cpu': "1", 'memory': "1Gi"}}}]
+      pods.append({'metadata': {'name': "pod-" + str(i), 'namespace': "default"}, 'spec': spec})
+
+   return pods
+
+class FakeShapesClient(object):
+   """
+   FakeShapesClient
+   Stand-in for the compute client, listing fixed shapes over two pages.
+   """
+   def __init__(self, shapes):
+      self.shapes = shapes
+      self.calls = 0
+
+   def list_shapes(self, compartment_id, page=None):
+      self.calls += 1
+      response = fakes.FakeResponse(self.shapes[1:] if page else self.shapes[:1])
+      response.has_next_page = page is None
+      response.next_page = None if page else "page-2"
+      return response
+
+def close(value, expected):
+   return abs(value - expected) <= 1e-9 * max(abs(expected), 1)
+
+def check_parse_quantity():
+   """
+   check_parse_quantity
+   Kubernetes quantities must be converted with their decimal & binary suffixes.
+   """
+   for quantity, expected in [("250m", 0.25), ("1.5", 1.5), (2, 2), ("512Mi", 512 * 1024 ** 2), ("1Gi", 1024 ** 3),
+                              ("1G", 1e9), ("128k", 128e3), ("100Ki", 102400), ("500u", 5e-4), ("0", 0)]:
+      assert close(func.parse_quantity(quantity), expected), (quantity, func.parse_quantity(quantity))
+
+def check_pod_requests():
+   """
+   check_pod_requests
+   Pod requests must be the greater of the container requests sum & the largest init container
+   request, plus the pod overhead.
+   """
+   def pod(containers, init_containers=None, overhead=None):
+      spec = {'containers': [{'name': "c", 'resources': {'requests': requests}} for requests in containers]}
+      if init_containers:
+         spec['initContainers'] = [{'name': "i", 'resources': {'requests': requests}} for requests in init_containers]
+      if overhead:
+         spec['overhead'] = overhead
+      return {'metadata': {'name': "pod"}, 'spec': spec}
+
+   cases = [(pod([{'cpu': "500m", 'memory': "1Gi"}, {'cpu': "250m", 'memory': "512Mi"}]), (0.75, 1.5 * 1024 ** 3)),
+            # the init container dominates the cpu, the containers the memory..
+            (pod([{'cpu': "500m", 'memory': "1Gi"}, {'cpu': "250m"}], [{'cpu': "2", 'memory': "256Mi"}, {'cpu': "1"}]), (2, 1024 ** 3)),
+            (pod([{'cpu': "1", 'memory': "1Gi"}], overhead={'cpu': "100m", 'memory': "64Mi"}), (1.1, 1088 * 1024 ** 2)),
+            (pod([{'cpu': "1"}], [{'memory': "2Gi"}], {'cpu': "250m"}), (1.25, 2 * 1024 ** 3)),
+            (pod([{}]), (0, 0)),
+            ({'metadata': {'name': "pod"}, 'spec': {'containers': [{'name': "c", 'resources': None}]}}, (0, 0))]
+   for pod_json, (expected_cpu, expected_memory) in cases:
+      pod_cpu, pod_memory = func.get_pod_requests(pod_json)
+      assert close(pod_cpu, expected_cpu) and close(pod_memory, expected_memory), (pod_json['spec'], pod_cpu, pod_memory)
+
+def check_bin_pack():
+   """
+   check_bin_pack
+   Bin packing must return the known node counts, bounded by node_max_pods, with pods larger than an
+   empty node counted as unfit rather than placed.
+   """
+   gi = 1024 ** 3
+   cases = [([], 110, (0, 0)),
+            ([(1, gi)] * 10, 110, (3, 0)),
+            # limited by the pods per node, not the cpu..
+            ([(0.1, gi)] * 10, 4, (3, 0)),
+            ([(1, gi)] * 10, 2, (5, 0)),
+            # the 1 cpu pods fill the space left by the 3 cpu pods..
+            ([(1, gi), (3, gi), (1, gi), (3, gi)], 110, (2, 0)),
+            # memory is the dominant resource..
+            ([(0.1, 9 * gi)] * 3, 110, (3, 0)),
+            ([(0.1, 8 * gi)] * 3, 110, (2, 0)),
+            # pods exceeding the node capacity..
+            ([(5, gi), (1, 17 * gi), (1, gi)], 110, (1, 2)),
+            ([(5, gi)], 110, (0, 1))]
+   for pods_requests, node_max_pods, expected in cases:
+      assert func.bin_pack_pods(pods_requests, 4, 16 * gi, node_max_pods) == expected, (pods_requests, node_max_pods)
+
+   # end to end, 8 pods of 1 cpu on a 2 ocpu (4 vcpu) node..
+   node_pool_details = {'node_shape': "VM.Standard.E4.Flex", 'node_shape_config': {'ocpus': 2, 'memory_in_gbs': 16}}
+   pods = [{'metadata': {'name': "pod"}, 'spec': {'containers': [{'name': "c", 'resources': {'requests': {'cpu': "1", 'memory': "1Gi"}}}]}}] * 8
+   assert func.get_scale_up_size(None, node_pool_details, pods, 1, 110) == 2
+   assert func.get_scale_up_size(None, node_pool_details, pods[:1], 1, 110) == 1
+
+def check_shape_capacity():
+   """
+   check_shape_capacity
+   Node capacity must count a single vcpu per ocpu on ampere (A1) shapes and two otherwise, and read
+   fixed shapes from the (cached) compute shape list.
+   """
+   gi = 1024 ** 3
+   client = FakeShapesClient([{'shape': "VM.Standard2.2", 'ocpus': 2, 'memory_in_gbs': 30},
+                              {'shape': "BM.Standard.A1.160", 'ocpus': 160, 'memory_in_gbs': 1024}])
+   cases = [("VM.Standard.A1.Flex", {'ocpus': 4, 'memory_in_gbs': 24}, 1, (4, 24 * gi)),
+            ("VM.Standard.E4.Flex", {'ocpus': 4, 'memory_in_gbs': 24}, 1, (8, 24 * gi)),
+            ("VM.Standard3.Flex", {'ocpus': 1, 'memory_in_gbs': 16}, 0.5, (1, 8 * gi)),
+            # fixed shapes, the second from the second page of the shape list..
+            ("VM.Standard2.2", None, 0.5, (2, 15 * gi)),
+            ("BM.Standard.A1.160", None, 1, (160, 1024 * gi))]
+   func.invalidate_cache()
+   try:
+      for node_shape, node_shape_config, allocatable_ratio, (expected_cpu, expected_memory) in cases:
+         node_pool_details = {'node_shape': node_shape, 'node_shape_config': node_shape_config, 'compartment_id': "ocid1.compartment.oc1..fake"}
+         node_cpu, node_memory = func.get_node_shape_capacity(client, node_pool_details, allocatable_ratio)
+         assert close(node_cpu, expected_cpu) and close(node_memory, expected_memory), (node_shape, node_cpu, node_memory)
+      # both pages listed once, then cached..
+      assert client.calls == 2, client.calls
+      # an unknown shape adds a single node..
+      node_pool_details = {'node_shape': "VM.Unknown.1", 'compartment_id': "ocid1.compartment.oc1..fake"}
+      assert func.get_scale_up_size(client, node_pool_details, [], 1, 110) == 1
+   finally:
+      func.invalidate_cache()
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark bin-packing scale-up sizing.")
+   parser.add_argument('--pods', type=int, nargs='+', default=[100, 1000, 5000, 10000], help="unschedulable pod counts")
+   parser.add_argument('--ocpus', type=float, default=4, help="node shape ocpus")
+   parser.add_argument('--memory', type=float, default=32, help="node shape memory (GB)")
+   args = parser.parse_args()
+
+   check_parse_quantity()
+   check_pod_requests()
+   check_bin_pack()
+   check_shape_capacity()
+
+   node_pool_details = {'node_shape': "VM.Standard.E4.Flex", 'compartment_id': "ocid1.compartment.oc1..fake",
+                        'node_shape_config': {'ocpus': args.ocpus, 'memory_in_gbs': args.memory}}
+   print("pods   nodes-required  requests(s)  bin-pack(s)")
+   for pod_count in args.pods:
+      pods = synthetic_pods(pod_count)
+      node_cpu, node_memory = func.get_node_shape_capacity(None, node_pool_details, 0.9)
+      start = time.monotonic()
+      pods_requests = [func.get_pod_requests(pod) for pod in pods]
+      requests_time = time.monotonic() - start
+      start = time.monotonic()
+      nodes_required, unfit_pods = func.bin_pack_pods(pods_requests, node_cpu, node_memory, 110)
+      print("%5d  %14d  %11.3f  %11.3f" % (pod_count, nodes_required, requests_time, time.monotonic() - start))
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,87 @@
+"""
+bench_startup
+Benchmark the function's cold start: the time taken to import func.py in a fresh interpreter, and to
+load the OCI service modules on first use, measured with python -X importtime. Compares the working
+tree with func.py at other git refs, and lists the modules with the largest cumulative import time.
+
+   $ python benchmarks/bench_startup.py --runs 10
+   $ python benchmarks/bench_startup.py --ref HEAD~1 --eager
+"""
+import os
+import re
+import sys
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+function_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oke-autoscaler")
+
+# the OCI service modules used by the function, loaded by the SDK on first use..
+first_use = "import oci; oci.container_engine; oci.core; oci.monitoring; oci.secrets"
+
+def checkout(ref, directory):
+   """
+   checkout
+   Write func.py at the git ref (or the working tree, where ref is None) into directory.
+   """
+   os.makedirs(directory)
+   if ref is None:
+      shutil.copy(os.path.join(function_directory, "func.py"), directory)
+   else:
+      source = subprocess.run(["git", "show", ref + ":oke-autoscaler/func.py"], cwd=function_directory,
+                              stdout=subprocess.PIPE, check=True).stdout
+      with open(os.path.join(directory, "func.py"), "wb") as f:
+         f.write(source)
+   return directory
+
+def import_times(directory, code, eager):
+   """
+   import_times
+   Run code in a fresh interpreter under -X importtime. Returns the cumulative import time of each
+   top level module, in microseconds.
+   """
+   env = dict(os.environ, PYTHONPATH=directory)
+   if eager:
+      # emulates python 3.6, where the oci sdk imports every service module..
+      env['OCI_PYTHON_SDK_LAZY_IMPORTS_DISABLED'] = "true"
+   stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=directory, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True).stderr.decode()
+   times = {}
+   # site & encodings are interpreter startup, not the function..
+   for line in stderr.splitlines():
+      match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)', line)
+      if match and match.group(2) == " " and match.group(3) not in ["site", "encodings"]:
+         times[match.group(3)] = times.get(match.group(3), 0) + int(match.group(1))
+   return times
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark the cold start import time of the oke-autoscaler function.")
+   parser.add_argument('--ref', action='append', default=[], help="git ref of func.py to compare with the working tree")
+   parser.add_argument('--runs', type=int, default=5, help="fresh interpreters per measurement")
+   parser.add_argument('--top', type=int, default=8, help="modules listed by cumulative import time")
+   parser.add_argument('--eager', action='store_true', help="disable the oci sdk's lazy loading of service modules")
+   args = parser.parse_args()
+
+   work_directory = tempfile.mkdtemp(prefix="oke-autoscaler-bench-")
+   try:
+      print("func.py        import(ms)  first-use(ms)  total(ms)")
+      for i, ref in enumerate([None] + args.ref):
+         directory = checkout(ref, os.path.join(work_directory, str(i)))
+         import_runs = []
+         total_runs = []
+         for run in range(args.runs):
+            import_runs.append(sum(import_times(directory, "import func", args.eager).values()))
+            total_times = import_times(directory, "import func; " + first_use, args.eager)
+            total_runs.append(sum(total_times.values()))
+         import_ms = statistics.median(import_runs) / 1000.0
+         total_ms = statistics.median(total_runs) / 1000.0
+         print("%-13s  %10.1f  %13.1f  %9.1f" % (ref or "working-tree", import_ms, total_ms - import_ms, total_ms))
+         for module, module_time in sorted(total_times.items(), key=lambda item: -item[1])[:args.top]:
+            print("   %-46s %8.1f" % (module, module_time / 1000.0))
+   finally:
+      shutil.rmtree(work_directory)
+
+if __name__ == "__main__":
+   main()
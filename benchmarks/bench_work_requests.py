@@ -0,0 +1,104 @@
+"""
+bench_work_requests
+Benchmark the tracking of in-flight work requests across invocations against a fake ContainerEngine
+client moving through the work request states: the result, api calls & wall time of an invocation
+polling a tracked update in each state. Also checks that updating states report node-pool-updating,
+that FAILED work requests have their errors listed, that completed work requests are cleared from the
+state store, and that the legacy single work_request_id record is migrated.
+
+   $ python benchmarks/bench_work_requests.py --latency 0.05
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import fakes
+import simulator
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oke-autoscaler"))
+import func
+
+updating_statuses = ["ACCEPTED", "IN_PROGRESS", "CANCELING"]
+statuses = updating_statuses + ["SUCCEEDED", "FAILED", "CANCELED"]
+
+def invoke_tracked(cluster, work_request_statuses, legacy=False):
+   """
+   invoke_tracked
+   Record work requests in the given states in the state store, as submitted by a previous invocation,
+   then invoke the function. Returns the result, the api calls made by operation, the wall time and
+   the state saved for the node pool.
+   """
+   with simulator.simulated_function(cluster):
+      state_store = func.get_state_store(None, os.environ['state_store'])
+      work_request_ids = []
+      with cluster.lock:
+         for status in work_request_statuses:
+            work_request_id = cluster.new_work_request(cluster.now + datetime.timedelta(days=1))
+            cluster.work_requests[work_request_id]['status'] = status
+            if status == "FAILED":
+               cluster.work_requests[work_request_id]['errors'] = [{'code': "InternalError", 'message': "Node pool update failed"}]
+            work_request_ids.append(work_request_id)
+      if legacy:
+         func.save_state(state_store, cluster.node_pool_id, {'work_request_id': work_request_ids[0]})
+      else:
+         func.save_state(state_store, cluster.node_pool_id, {'work_request_ids': work_request_ids})
+      api_calls = dict(cluster.api_calls)
+      start = time.monotonic()
+      result_dict = json.loads(func.do(None))
+      wall_time = time.monotonic() - start
+      state = func.load_state(state_store, cluster.node_pool_id)
+   calls = {operation: count - api_calls.get(operation, 0) for operation, count in cluster.api_calls.items() if count - api_calls.get(operation, 0)}
+
+   return result_dict, calls, wall_time, state, work_request_ids
+
+def check_work_request_states():
+   """
+   check_work_request_states
+   A tracked work request must be polled with a single get_work_request call: the node pool is updating
+   while any work request is in progress, without listing the pods. Once all have completed, the errors
+   of FAILED work requests are listed and the work requests are cleared from the state store.
+   """
+   cases = [([status], status in updating_statuses, int(status == "FAILED"), False) for status in statuses]
+   cases += [(["SUCCEEDED", "IN_PROGRESS"], True, 0, False),
+             (["SUCCEEDED", "FAILED", "FAILED"], False, 2, False),
+             # the single work request id recorded by earlier versions..
+             (["ACCEPTED"], True, 0, True),
+             (["FAILED"], False, 1, True)]
+   for work_request_statuses, updating, expected_errors_calls, legacy in cases:
+      cluster = fakes.FakeCluster()
+      cluster.set_replicas(3)
+      cluster.advance(3)
+      result_dict, calls, wall_time, state, work_request_ids = invoke_tracked(cluster, work_request_statuses, legacy)
+      case = (work_request_statuses, legacy, result_dict, calls)
+      assert calls['container_engine.get_work_request'] == len(work_request_statuses), case
+      assert calls.get('container_engine.list_work_request_errors', 0) == expected_errors_calls, case
+      if updating:
+         assert result_dict['success']['reason'] == 'node-pool-updating', case
+         assert result_dict['success']['node-pool-status'] == "updating", case
+         assert 'kubernetes.get' not in calls and 'secrets.get_secret_bundle' not in calls, case
+         # polled again by the next invocation..
+         assert state.get('work_request_ids', [state.get('work_request_id')]) == work_request_ids, (case, state)
+      else:
+         assert result_dict['success']['reason'] != 'node-pool-updating', case
+         assert 'work_request_id' not in state, (case, state)
+         assert not set(state.get('work_request_ids', [])) & set(work_request_ids), (case, state)
+
+def main():
+   parser = argparse.ArgumentParser(description="Benchmark the tracking of in-flight work requests across invocations.")
+   parser.add_argument('--latency', type=float, default=0.05, help="seconds of latency injected into each api call")
+   args = parser.parse_args()
+
+   check_work_request_states()
+
+   print("work-request  reason               api-calls  wall-time(s)")
+   for status in statuses:
+      cluster = fakes.FakeCluster(latency=args.latency)
+      cluster.set_replicas(3)
+      cluster.advance(3)
+      result_dict, calls, wall_time, state, work_request_ids = invoke_tracked(cluster, [status])
+      print("%-12s  %-19s  %9d  %12.3f" % (status, result_dict['success']['reason'], sum(calls.values()), wall_time))
+
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,588 @@
+import re
+import json
+import time
+import base64
+import random
+import datetime
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import oci
+
+# in-memory fake OCI & kubernetes backends..
+class FakeModel(object):
+   """
+   FakeModel
+   Stand-in for an oci model: attributes are read from the wrapped dict, and str() returns
+   the JSON representation (as with oci models).
+   """
+   def __init__(self, value):
+      self._value = value
+
+   def __getattr__(self, name):
+      if name.startswith('_') or not isinstance(self._value, dict) or name not in self._value:
+         raise AttributeError(name)
+      value = self._value[name]
+      return FakeModel(value) if isinstance(value, (dict, list)) else value
+
+   def __iter__(self):
+      return (FakeModel(value) if isinstance(value, (dict, list)) else value for value in self._value)
+
+   def __len__(self):
+      return len(self._value)
+
+   def __str__(self):
+      return json.dumps(self._value)
+
+class FakeResponse(object):
+   """
+   FakeResponse
+   Stand-in for an oci response.
+   """
+   def __init__(self, data, headers=None):
+      self.data = data if isinstance(data, FakeModel) else FakeModel(data)
+      self.headers = headers or {}
+      self.status = 200
+      self.has_next_page = False
+      self.next_page = None
+
+class FakeCluster(object):
+   """
+   FakeCluster
+   Simulated OKE cluster with a single node pool, running replicas of a single workload.
+   Time is virtual, and only moves forward when advance() is called.
+
+   The node pool's nodes are provisioned provision_minutes after an update is submitted. Workload
+   pods are scheduled first-fit onto active, uncordoned nodes, and are otherwise Pending with the
+   Unschedulable condition. Node cpu & memory utilization is the sum of the requests of the pods on
+   the node, scaled by usage_ratio. Where pdb_max_unavailable is set, the workload has a
+   PodDisruptionBudget, and evictions are refused while too many of its pods are pending. When the
+   workload scales in, pending pods are removed first, then the newest pods or (pod_removal "random")
+   pods at random.
+
+   OCI api calls fail at random at failure_rate, with failure_status. scripted_failures maps an
+   operation ("service.operation") to the statuses of its successive calls, e.g. [429, 429, None, 503],
+   where None is a successful call - calls beyond the end of the script succeed.
+   """
+   def __init__(self, node_count=2, node_ocpus=2, node_memory_in_gbs=16, pod_cpu=0.5, pod_memory=1024 ** 3,
+                node_pool_name="pool1", provision_minutes=6, delete_minutes=1, usage_ratio=0.8, latency=0.0,
+                failure_rate=0.0, failure_status=500, scripted_failures=None, pdb_max_unavailable=None, pod_removal="newest", seed=0):
+      self.lock = threading.RLock()
+      self.random = random.Random(seed)
+      self.now = datetime.datetime(2020, 5, 20, 0, 0, tzinfo=datetime.timezone.utc)
+      self.node_pool_id = "ocid1.nodepool.oc1..fake"
+      self.cluster_id = "ocid1.cluster.oc1..fake"
+      self.compartment_id = "ocid1.compartment.oc1..fake"
+      self.secret_id = "ocid1.vaultsecret.oc1..fake"
+      self.node_pool_name = node_pool_name
+      self.node_ocpus = node_ocpus
+      self.node_memory_in_gbs = node_memory_in_gbs
+      self.node_cpu = node_ocpus * 2
+      self.node_memory = node_memory_in_gbs * 1024 ** 3
+      self.pod_cpu = pod_cpu
+      self.pod_memory = pod_memory
+      self.provision_minutes = provision_minutes
+      self.delete_minutes = delete_minutes
+      self.usage_ratio = usage_ratio
+      self.latency = latency
+      self.failure_rate = failure_rate
+      self.failure_status = failure_status
+      self.scripted_failures = {key: list(statuses) for key, statuses in (scripted_failures or {}).items()}
+      self.api_calls = {}
+      self.nodes = []
+      self.pods = {}
+      self.pod_sequence = 0
+      self.pod_events = []
+      self.pod_events_changed = threading.Condition(self.lock)
+      self.node_sequence = 0
+      self.work_requests = {}
+      self.utilization = {}
+      self.replicas = 0
+      self.pdb_max_unavailable = pdb_max_unavailable
+      self.pod_removal = pod_removal
+      self.evictions = 0
+      self.size = 0
+      created = self.now - datetime.timedelta(hours=1)
+      for i in range(node_count):
+         self.add_node(created, "ACTIVE")
+      self.size = node_count
+
+   # api call accounting & latency / failure injection..
+   def call(self, service, operation):
+      with self.lock:
+         key = service + "." + operation
+         self.api_calls[key] = self.api_calls.get(key, 0) + 1
+         status = self.failure_status if self.random.random() < self.failure_rate else None
+         if self.scripted_failures.get(key):
+            status = self.scripted_failures[key].pop(0)
+      if self.latency:
+         time.sleep(self.latency)
+      if status == 429:
+         raise oci.exceptions.ServiceError(status, "TooManyRequests", {}, "injected throttling: " + key)
+      if status:
+         raise oci.exceptions.ServiceError(status, "InjectedFailure", {}, "injected failure: " + key)
+
+   def api_call_count(self):
+      with self.lock:
+         return sum(self.api_calls.values())
+
+   # cluster state..
+   def add_node(self, created, lifecycle_state):
+      self.node_sequence += 1
+      node = {'id': "ocid1.instance.oc1..node" + str(self.node_sequence),
+              'name': "oke-node-" + str(self.node_sequence),
+              'private_ip': "10.0." + str(self.node_sequence // 250) + "." + str(self.node_sequence % 250 + 2),
+              'lifecycle_state': lifecycle_state,
+              'created': created,
+              'ready_at': created + datetime.timedelta(minutes=self.provision_minutes),
+              'deleted_at': None,
+              'unschedulable': False}
+      self.nodes.append(node)
+      return node
+
+   def live_nodes(self):
+      return [node for node in self.nodes if node['lifecycle_state'] != "DELETED"]
+
+   def pending_pods(self):
+      with self.lock:
+         return [pod for pod in self.pods.values() if pod['node'] is None]
+
+   def set_replicas(self, replicas):
+      with self.lock:
+         self.replicas = replicas
+         names = sorted(self.pods, key=lambda name: self.pods[name]['sequence'])
+         # remove the newest pods, pending pods first..
+         while len(self.pods) > replicas:
+            pending = [name for name in names if self.pods[name]['node'] is None]
+            if pending:
+               name = pending[-1]
+            elif self.pod_removal == "random":
+               name = self.random.choice(names)
+            else:
+               name = names[-1]
+            names.remove(name)
+            self.pod_event("DELETED", self.pods.pop(name))
+         while len(self.pods) < replicas:
+            self.new_pod()
+
+   def new_pod(self, node_pool_name=None, pending_reason="Unschedulable"):
+      self.pod_sequence += 1
+      name = "app-" + str(self.pod_sequence)
+      self.pods[name] = {'name': name, 'uid': name + "-uid", 'sequence': self.pod_sequence, 'node': None, 'created': self.now,
+                         'node_pool_name': node_pool_name or self.node_pool_name, 'pending_reason': pending_reason}
+      self.pod_event("ADDED", self.pods[name])
+      return self.pods[name]
+
+   def pod_event(self, event_type, pod):
+      """
+      pod_event
+      Record a change to a pod for pod watches, the resourceVersion being the number of changes recorded.
+      """
+      with self.lock:
+         pod_json = self.pod_json(pod)
+         pod_json['metadata']['resourceVersion'] = str(len(self.pod_events) + 1)
+         self.pod_events.append({'type': event_type, 'object': pod_json})
+         self.pod_events_changed.notify_all()
+
+   def node_requests(self, node_name):
+      pods = [pod for pod in self.pods.values() if pod['node'] == node_name]
+      return len(pods) * self.pod_cpu, len(pods) * self.pod_memory
+
+   def schedule(self):
+      with self.lock:
+         for pod in sorted(self.pending_pods(), key=lambda pod: pod['sequence']):
+            for node in self.nodes:
+               if node['lifecycle_state'] != "ACTIVE" or node['unschedulable']:
+                  continue
+               node_cpu, node_memory = self.node_requests(node['private_ip'])
+               if node_cpu + self.pod_cpu <= self.node_cpu * 0.9 and node_memory + self.pod_memory <= self.node_memory * 0.9:
+                  pod['node'] = node['private_ip']
+                  self.pod_event("MODIFIED", pod)
+                  break
+
+   def advance(self, minutes=1):
+      """
+      advance
+      Move virtual time forward, completing node provisioning & deletion, scheduling pending pods and
+      recording node utilization for each minute.
+      """
+      with self.lock:
+         for minute in range(minutes):
+            self.now += datetime.timedelta(minutes=1)
+            for node in self.nodes:
+               if node['lifecycle_state'] == "CREATING" and self.now >= node['ready_at']:
+                  node['lifecycle_state'] = "ACTIVE"
+               if node['lifecycle_state'] == "DELETING" and self.now >= node['deleted_at']:
+                  node['lifecycle_state'] = "DELETED"
+                  for pod in self.pods.values():
+                     if pod['node'] == node['private_ip']:
+                        pod['node'] = None
+                        self.pod_event("MODIFIED", pod)
+            for work_request in self.work_requests.values():
+               if work_request['status'] in ["ACCEPTED", "IN_PROGRESS"] and self.now >= work_request['complete_at']:
+                  work_request['status'] = "SUCCEEDED"
+            self.schedule()
+            for node in self.live_nodes():
+               if node['lifecycle_state'] == "ACTIVE":
+                  node_cpu, node_memory = self.node_requests(node['private_ip'])
+                  sample = (self.now, 100.0 * self.usage_ratio * node_cpu / self.node_cpu, 100.0 * self.usage_ratio * node_memory / self.node_memory)
+                  self.utilization.setdefault(node['id'], []).append(sample)
+
+   def resize(self, size):
+      """
+      resize
+      Add or remove nodes to match the node pool size. Nodes are removed cordoned first, then newest first.
+      Returns the time at which the resize completes.
+      """
+      live_nodes = [node for node in self.live_nodes() if node['lifecycle_state'] != "DELETING"]
+      complete_at = self.now + datetime.timedelta(minutes=1)
+      while len(live_nodes) < size:
+         node = self.add_node(self.now, "CREATING")
+         live_nodes.append(node)
+         complete_at = max(complete_at, node['ready_at'])
+      while len(live_nodes) > size:
+         node = sorted(live_nodes, key=lambda node: (node['unschedulable'], node['created']))[-1]
+         self.delete(node)
+         live_nodes.remove(node)
+         complete_at = max(complete_at, node['deleted_at'])
+      self.size = size
+
+      return complete_at
+
+   def remove(self, node_id, decrement_size):
+      """
+      remove
+      Delete the specified node, decrementing the node pool size or otherwise replacing the node.
+      Returns the time at which the removal completes.
+      """
+      node = next(node for node in self.live_nodes() if node['id'] == node_id)
+      self.delete(node)
+      complete_at = node['deleted_at']
+      if decrement_size:
+         self.size -= 1
+      else:
+         complete_at = max(complete_at, self.add_node(self.now, "CREATING")['ready_at'])
+
+      return complete_at
+
+   def delete(self, node):
+      node['lifecycle_state'] = "DELETING"
+      node['deleted_at'] = self.now + datetime.timedelta(minutes=self.delete_minutes)
+
+   def new_work_request(self, complete_at):
+      work_request_id = "ocid1.clustersworkrequest.oc1..wr" + str(len(self.work_requests) + 1)
+      self.work_requests[work_request_id] = {'id': work_request_id, 'status': "ACCEPTED", 'complete_at': complete_at,
+                                             'compartment_id': self.compartment_id}
+      return work_request_id
+
+   # kubernetes representations..
+   def pod_json(self, pod):
+      pod_json = {'metadata': {'name': pod['name'], 'namespace': "default", 'uid': pod['uid'],
+                               'labels': {'app': "app"}, 'ownerReferences': [{'kind': "ReplicaSet", 'name': "app"}]},
+                  'spec': {'nodeSelector': {'name': pod['node_pool_name']},
+                           'containers': [{'name': "app", 'resources': {'requests': {'cpu': str(self.pod_cpu), 'memory': str(self.pod_memory)}}}]},
+                  'status': {'phase': "Running"}}
+      if pod['node'] is None:
+         pod_json['status'] = {'phase': "Pending", 'conditions': [{'type': "PodScheduled", 'status': "False", 'reason': pod['pending_reason']}]}
+      else:
+         pod_json['spec']['nodeName'] = pod['node']
+
+      return pod_json
+
+   def pdb_json(self):
+      """
+      pdb_json
+      The workload's PodDisruptionBudget, where pdb_max_unavailable is set: pending pods count as unavailable.
+      """
+      if self.pdb_max_unavailable is None:
+         return []
+      disruptions_allowed = max(self.pdb_max_unavailable - len(self.pending_pods()), 0)
+      return [{'metadata': {'name': "app", 'namespace': "default"},
+               'spec': {'maxUnavailable': self.pdb_max_unavailable, 'selector': {'matchLabels': {'app': "app"}}},
+               'status': {'disruptionsAllowed': disruptions_allowed}}]
+
+   def evict(self, name):
+      """
+      evict
+      Evict a pod, which the workload controller replaces with a new pending pod.
+      Returns the eviction api status: 201 evicted, 404 not found or 429 refused by the PodDisruptionBudget.
+      """
+      with self.lock:
+         if name not in self.pods:
+            return 404
+         if self.pdb_json() and self.pdb_json()[0]['status']['disruptionsAllowed'] < 1:
+            return 429
+         self.pod_event("DELETED", self.pods.pop(name))
+         self.evictions += 1
+         if len(self.pods) < self.replicas:
+            self.new_pod()
+         return 201
+
+class FakeContainerEngineClient(object):
+   def __init__(self, cluster, kube_server):
+      self.cluster = cluster
+      self.kube_server = kube_server
+
+   def get_node_pool(self, node_pool_id):
+      self.cluster.call("container_engine", "get_node_pool")
+      cluster = self.cluster
+      with cluster.lock:
+         nodes = [{'id': node['id'], 'name': node['name'], 'private_ip': node['private_ip'], 'lifecycle_state': node['lifecycle_state'],
+                   'availability_domain': "AD-1", 'subnet_id': "ocid1.subnet.oc1..fake", 'node_pool_id': node_pool_id}
+                  for node in cluster.nodes]
+         return FakeResponse({'id': node_pool_id, 'compartment_id': cluster.compartment_id, 'cluster_id': cluster.cluster_id,
+                              'name': cluster.node_pool_name, 'node_shape': "VM.Standard.E4.Flex",
+                              'node_shape_config': {'ocpus': cluster.node_ocpus, 'memory_in_gbs': cluster.node_memory_in_gbs},
+                              'initial_node_labels': [{'key': "name", 'value': cluster.node_pool_name}],
+                              'node_config_details': {'size': cluster.size, 'placement_configs': [{'availability_domain': "AD-1", 'subnet_id': "ocid1.subnet.oc1..fake"}]},
+                              'nodes': nodes})
+
+   def update_node_pool(self, node_pool_id, update_node_pool_details, **kwargs):
+      self.cluster.call("container_engine", "update_node_pool")
+      with self.cluster.lock:
+         complete_at = self.cluster.resize(update_node_pool_details.node_config_details.size)
+         work_request_id = self.cluster.new_work_request(complete_at)
+      return FakeResponse(None, {'opc-work-request-id': work_request_id})
+
+   def delete_node(self, node_pool_id, node_id, is_decrement_size=False, **kwargs):
+      self.cluster.call("container_engine", "delete_node")
+      with self.cluster.lock:
+         complete_at = self.cluster.remove(node_id, is_decrement_size)
+         work_request_id = self.cluster.new_work_request(complete_at)
+      return FakeResponse(None, {'opc-work-request-id': work_request_id})
+
+   def get_work_request(self, work_request_id, **kwargs):
+      self.cluster.call("container_engine", "get_work_request")
+      with self.cluster.lock:
+         work_request = self.cluster.work_requests[work_request_id]
+         return FakeResponse({'id': work_request['id'], 'status': work_request['status'], 'compartment_id': work_request['compartment_id']})
+
+   def list_work_request_errors(self, compartment_id, work_request_id, **kwargs):
+      self.cluster.call("container_engine", "list_work_request_errors")
+      with self.cluster.lock:
+         return FakeResponse(self.cluster.work_requests[work_request_id].get('errors', []))
+
+   def create_kubeconfig(self, cluster_id, **kwargs):
+      self.cluster.call("container_engine", "create_kubeconfig")
+      kubeconfig = ("apiVersion: v1\nclusters:\n- cluster:\n    server: " + self.kube_server + "\n  name: fake\n"
+                    "kind: Config\n")
+      response = FakeResponse(None)
+      response.data = FakeModel({'text': kubeconfig})
+      return response
+
+class FakeComputeClient(object):
+   def __init__(self, cluster):
+      self.cluster = cluster
+
+   def get_instance(self, instance_id, **kwargs):
+      self.cluster.call("compute", "get_instance")
+      with self.cluster.lock:
+         node = next(node for node in self.cluster.nodes if node['id'] == instance_id)
+         return FakeResponse({'id': node['id'], 'time_created': node['created'].isoformat(), 'lifecycle_state': "RUNNING"})
+
+class FakeMonitoringClient(object):
+   def __init__(self, cluster):
+      self.cluster = cluster
+
+   def summarize_metrics_data(self, compartment_id, summarize_metrics_data_details, **kwargs):
+      """
+      summarize_metrics_data
+      Supports queries of the form Metric[interval]{resourceId = "<id>"}.mean() and
+      Metric[interval]{resourceId =~ "<id>|<id>"}.mean(), aggregated at the query resolution.
+      """
+      self.cluster.call("monitoring", "summarize_metrics_data")
+      details = summarize_metrics_data_details
+      match = re.match(r'(\w+)\[(\d+)m\]\{resourceId\s*=~?\s*"?([^"}]*)"?\}\.mean\(\)', details.query)
+      metric, interval, resource_ids = match.group(1), int(match.group(2)), match.group(3).split("|")
+      column = 1 if metric == "CpuUtilization" else 2
+      start_time = parse_time(details.start_time)
+      end_time = parse_time(details.end_time)
+      resolution = int(details.resolution.rstrip("m"))
+      metric_data = []
+      with self.cluster.lock:
+         for resource_id in resource_ids:
+            samples = [sample for sample in self.cluster.utilization.get(resource_id, []) if start_time < sample[0] <= end_time]
+            buckets = {}
+            for sample in samples:
+               bucket = int((sample[0] - start_time).total_seconds() // 60 - 1) // resolution
+               buckets.setdefault(bucket, []).append(sample[column])
+            datapoints = [{'timestamp': (start_time + datetime.timedelta(minutes=(bucket + 1) * resolution)).isoformat(),
+                           'value': sum(values) / len(values)}
+                          for bucket, values in sorted(buckets.items())]
+            if datapoints:
+               metric_data.append({'namespace': details.namespace, 'name': metric,
+                                   'dimensions': {'resourceId': resource_id}, 'aggregated_datapoints': datapoints})
+      return FakeResponse(metric_data)
+
+class FakeSecretsClient(object):
+   def __init__(self, cluster):
+      self.cluster = cluster
+
+   def get_secret_bundle(self, secret_id, **kwargs):
+      self.cluster.call("secrets", "get_secret_bundle")
+      return FakeResponse({'secret_id': secret_id, 'secret_bundle_content': {'content_type': "BASE64",
+                           'content': base64.b64encode(b"fake-token").decode('utf-8')}})
+
+class FakeContext(object):
+   """
+   FakeContext
+   Stand-in for the fdk invoke context passed to the function handler. As with the fdk, the invocation
+   deadline defaults to 30 seconds after the context is created.
+   """
+   def __init__(self, timeout=30):
+      self.deadline = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=timeout)).isoformat()
+      self.headers = {}
+      self.status_code = None
+
+   def Deadline(self):
+      return self.deadline
+
+   def SetResponseHeaders(self, headers, status_code):
+      self.headers = headers
+      self.status_code = status_code
+
+def parse_time(value):
+   """
+   parse_time
+   Parse an ISO 8601 time (string or datetime) to a datetime.
+   """
+   if isinstance(value, datetime.datetime):
+      return value
+   value = value.replace("Z", "+00:00")
+   if re.search(r'[+-]\d\d:\d\d$', value):
+      value = value[:-3] + value[-2:]
+   for time_format in ["%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M:%S%z"]:
+      try:
+         return datetime.datetime.strptime(value, time_format)
+      except ValueError:
+         pass
+   raise ValueError("Unsupported time: " + value)
+
+# kubernetes api server stand-in..
+class FakeKubeApiHandler(BaseHTTPRequestHandler):
+   """
+   FakeKubeApiHandler
+   Serves the subset of the kubernetes api used by the autoscaler from the FakeCluster state.
+   """
+   def log_message(self, *args):
+      return
+
+   def send_json(self, code, body):
+      data = json.dumps(body).encode('utf-8')
+      self.send_response(code)
+      self.send_header('Content-Type', "application/json")
+      self.send_header('Content-Length', str(len(data)))
+      self.end_headers()
+      self.wfile.write(data)
+
+   def read_json(self):
+      length = int(self.headers.get('Content-Length') or 0)
+      return json.loads(self.rfile.read(length).decode('utf-8')) if length else None
+
+   def call(self, operation):
+      """
+      call
+      Account the api call, and send the status of an injected failure. Returns False where the call failed.
+      """
+      try:
+         self.server.cluster.call("kubernetes", operation)
+      except oci.exceptions.ServiceError as e:
+         self.send_json(e.status, {'kind': "Status", 'code': e.status, 'message': e.message})
+         return False
+      return True
+
+   def watch_pods(self, query):
+      """
+      watch_pods
+      Stream the pod changes after the resourceVersion, one JSON watch event per line, until timeoutSeconds.
+      Pods leaving the Pending phase of a status.phase=Pending watch are reported as DELETED.
+      """
+      cluster = self.server.cluster
+      position = int(query.get('resourceVersion') or 0)
+      end = time.monotonic() + float(query.get('timeoutSeconds') or 60)
+      self.send_response(200)
+      self.send_header('Content-Type', "application/json")
+      self.end_headers()
+      while True:
+         with cluster.lock:
+            while len(cluster.pod_events) <= position and time.monotonic() < end:
+               cluster.pod_events_changed.wait(end - time.monotonic())
+            events = cluster.pod_events[position:]
+         if not events:
+            return
+         position += len(events)
+         for event in events:
+            if query.get('fieldSelector') == "status.phase=Pending" and event['object']['status']['phase'] != "Pending":
+               event = dict(event, type="DELETED")
+            try:
+               self.wfile.write(json.dumps(event).encode('utf-8') + b"\n")
+            except OSError:
+               # watch closed by the client..
+               return
+
+   def do_GET(self):
+      cluster = self.server.cluster
+      url = urllib.parse.urlparse(self.path)
+      query = dict(urllib.parse.parse_qsl(url.query))
+      if url.path == "/api/v1/pods" and query.get('watch') == "true":
+         if self.call("watch"):
+            self.watch_pods(query)
+         return
+      if not self.call("get"):
+         return
+      with cluster.lock:
+         if url.path == "/api/v1/pods":
+            field_selector = query.get('fieldSelector', "")
+            pods = list(cluster.pods.values())
+            if field_selector == "status.phase=Pending":
+               pods = [pod for pod in pods if pod['node'] is None]
+            elif field_selector.startswith("spec.nodeName="):
+               pods = [pod for pod in pods if pod['node'] == field_selector.split("=", 1)[1]]
+            start = int(query.get('continue') or 0)
+            limit = int(query.get('limit') or len(pods) or 1)
+            page = pods[start:start + limit]
+            continue_token = str(start + limit) if start + limit < len(pods) else ""
+            return self.send_json(200, {'kind': "PodList", 'items': [cluster.pod_json(pod) for pod in page],
+                                        'metadata': {'continue': continue_token, 'resourceVersion': str(len(cluster.pod_events))}})
+         match = re.match(r'^/api/v1/namespaces/([^/]+)/pods/([^/]+)$', url.path)
+         if match and match.group(2) in cluster.pods:
+            return self.send_json(200, cluster.pod_json(cluster.pods[match.group(2)]))
+         if url.path.startswith("/apis/policy/v1/") and url.path.endswith("poddisruptionbudgets"):
+            return self.send_json(200, {'kind': "PodDisruptionBudgetList", 'items': cluster.pdb_json(), 'metadata': {}})
+      self.send_json(404, {'kind': "Status", 'code': 404})
+
+   def do_PATCH(self):
+      cluster = self.server.cluster
+      body = self.read_json()
+      if not self.call("patch"):
+         return
+      match = re.match(r'^/api/v1/nodes/([^/]+)$', self.path)
+      with cluster.lock:
+         nodes = [node for node in cluster.live_nodes() if match and node['private_ip'] == match.group(1)]
+         if not nodes:
+            return self.send_json(404, {'kind': "Status", 'code': 404})
+         nodes[0]['unschedulable'] = bool(body['spec']['unschedulable'])
+      self.send_json(200, {'kind': "Node", 'metadata': {'name': match.group(1)}})
+
+   def do_POST(self):
+      cluster = self.server.cluster
+      self.read_json()
+      if not self.call("post"):
+         return
+      match = re.match(r'^/api/v1/namespaces/([^/]+)/pods/([^/]+)/eviction$', self.path)
+      status = cluster.evict(match.group(2)) if match else 404
+      if status == 201:
+         return self.send_json(201, {'kind': "Status", 'status': "Success"})
+      self.send_json(status, {'kind': "Status", 'code': status})
+
+def start_kube_api_server(cluster):
+   """
+   start_kube_api_server
+   Start a kubernetes api server stand-in for the cluster on a local port, returning the server & its url.
+   """
+   server = ThreadingHTTPServer(('127.0.0.1', 0), FakeKubeApiHandler)
+   server.daemon_threads = True
+   server.cluster = cluster
+   threading.Thread(target=server.serve_forever, daemon=True).start()
+
+   return server, "http://127.0.0.1:" + str(server.server_port)
@@ -0,0 +1,200 @@
+"""
+simulator
+Replay a load trace through the autoscaler function, against in-memory fake OCI services and a
+kubernetes api server stand-in, and report api call counts, wall time per invocation, scaling
+decisions and time-to-capacity.
+
+A trace is the number of workload replicas required in each minute of the simulation. Built-in
+traces are burst, batch and diurnal, or a trace can be loaded from a JSON file containing a list of replica
+counts (one per minute).
+
+   $ python benchmarks/simulator.py --trace burst
+   $ python benchmarks/simulator.py --trace batch --nodes 30 --set node_pool_scale_down_max_step=10
+   $ python benchmarks/simulator.py --trace diurnal --set node_pool_scale_up_sizing=increment
+   $ python benchmarks/simulator.py --trace diurnal --days 3 --set node_pool_forecast=enabled
+   $ python benchmarks/simulator.py --trace trace.json --latency 0.05 --failure-rate 0.01
+   $ python benchmarks/simulator.py --trace burst --failure-rate 0.05 --failure-status 429 --set api_retry_base_delay=0.01
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+import contextlib
+import collections
+import fakes
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "oke-autoscaler"))
+import func
+
+# function configuration used by the simulation, unless overridden..
+default_config = {'node_pool_eval_window': "3",
+                  'node_pool_min_size': "1",
+                  'node_pool_max_size': "20",
+                  'node_pool_eval_cpu_load': "25",
+                  'node_pool_eval_ram_load': "0",
+                  'node_drain_timeout': "30",
+                  # token buckets refill in real time, not virtual time..
+                  'api_rate_limit': "0"}
+
+def burst_trace(base=10, peak=80, start=30, duration=120, minutes=300):
+   """
+   burst_trace
+   A constant load, with a step up to peak replicas for duration minutes.
+   """
+   return [peak if start <= minute < start + duration else base for minute in range(minutes)]
+
+def diurnal_trace(low=10, high=80, days=1, period=1440):
+   """
+   diurnal_trace
+   A daily load cycle, from low replicas at midnight to high replicas at midday.
+   """
+   return [int(round(low + (high - low) * (1 - math.cos(2 * math.pi * minute / period)) / 2)) for minute in range(days * period)]
+
+def load_trace(name, days=1):
+   """
+   load_trace
+   Load a built-in trace by name, or a trace from a JSON file.
+   """
+   if name == "burst":
+      return burst_trace()
+   if name == "batch":
+      # batch jobs complete, leaving work for 8 of 30 nodes..
+      return burst_trace(base=50, peak=200, start=0, duration=30, minutes=240)
+   if name == "diurnal":
+      return diurnal_trace(days=days)
+   with open(name) as f:
+      return json.load(f)
+
+@contextlib.contextmanager
+def simulated_function(cluster, config=None):
+   """
+   simulated_function
+   Run the autoscaler function against the cluster's fake OCI backends & kubernetes api server stand-in,
+   in the cluster's virtual time, for the duration of the context. config overrides the function configuration.
+   """
+   server, kube_server = fakes.start_kube_api_server(cluster)
+   clients = {'ContainerEngineClient': fakes.FakeContainerEngineClient(cluster, kube_server),
+              'ComputeClient': fakes.FakeComputeClient(cluster),
+              'MonitoringClient': fakes.FakeMonitoringClient(cluster),
+              'SecretsClient': fakes.FakeSecretsClient(cluster)}
+   state_directory = tempfile.mkdtemp(prefix="oke-autoscaler-sim-")
+   environ = dict(default_config, cluster_id=cluster.cluster_id, node_pool_id=cluster.node_pool_id,
+                  secret_id=cluster.secret_id, state_store="file:" + state_directory)
+   environ.update(config or {})
+
+   saved_environ = dict(os.environ)
+   saved_create_client = func.create_client
+   saved_utc_now = func.utc_now
+   os.environ.update(environ)
+   func.create_client = lambda signer, client_class, **kwargs: clients[client_class.__name__]
+   func.utc_now = lambda: cluster.now
+   func.invalidate_cache()
+   try:
+      yield
+   finally:
+      os.environ.clear()
+      os.environ.update(saved_environ)
+      func.create_client = saved_create_client
+      func.utc_now = saved_utc_now
+      func.invalidate_cache()
+      server.shutdown()
+      server.server_close()
+
+def simulate(trace, interval=3, config=None, cluster_options=None):
+   """
+   simulate
+   Replay the trace through the autoscaler function, invoked every interval minutes of virtual time.
+   config overrides the function configuration, cluster_options the FakeCluster options.
+   Returns the simulation report.
+   """
+   cluster = fakes.FakeCluster(**(cluster_options or {}))
+
+   invocations = []
+   pending_since = None
+   time_to_capacity = []
+   node_minutes = 0
+   pending_pod_minutes = 0
+   node_counts = []
+   with simulated_function(cluster, config):
+      for minute, replicas in enumerate(trace):
+         cluster.set_replicas(replicas)
+         cluster.advance(1)
+         pending = len(cluster.pending_pods())
+         node_minutes += len(cluster.live_nodes())
+         node_counts.append(len(cluster.live_nodes()))
+         pending_pod_minutes += pending
+         # time-to-capacity, from pods first pending to all pods scheduled..
+         if pending and pending_since is None:
+            pending_since = minute
+         if not pending and pending_since is not None:
+            time_to_capacity.append(minute - pending_since)
+            pending_since = None
+
+         if minute % interval == 0:
+            api_calls = cluster.api_call_count()
+            start = time.monotonic()
+            try:
+               result_dict = json.loads(func.do(None))
+            except Exception as e:
+               result_dict = {'error': {'reason': "invocation-failed", 'detail': str(e)}}
+            wall_time = time.monotonic() - start
+            result_data = [value for key, value in result_dict.items() if key not in ['cache', 'timings']][0]
+            invocations.append({'minute': minute, 'wall-time': wall_time, 'api-calls': cluster.api_call_count() - api_calls,
+                                'api-retries': sum(result_dict.get('timings', {}).get('retries', {}).values()),
+                                'status': [key for key in result_dict if key not in ['cache', 'timings']][0],
+                                'action': result_data.get('action'), 'reason': result_data.get('reason'),
+                                'node-count': result_data.get('node-count'), 'pending-pods': pending})
+
+   # time-to-converge, from the last change in load to the last change in node count..
+   last_load_change = max([minute for minute in range(1, len(trace)) if trace[minute] != trace[minute - 1]] or [0])
+   last_node_change = max([minute for minute in range(1, len(node_counts)) if node_counts[minute] != node_counts[minute - 1]] or [0])
+
+   wall_times = [invocation['wall-time'] for invocation in invocations]
+   return {'minutes': len(trace),
+           'invocations': len(invocations),
+           'failed-invocations': len([invocation for invocation in invocations if invocation['status'] == "error"]),
+           'api-calls': sum(invocation['api-calls'] for invocation in invocations),
+           'api-calls-per-invocation': sum(invocation['api-calls'] for invocation in invocations) / max(len(invocations), 1),
+           'api-calls-by-operation': dict(sorted(cluster.api_calls.items())),
+           'api-retries': sum(invocation['api-retries'] for invocation in invocations),
+           'wall-time-per-invocation': {'mean': sum(wall_times) / max(len(wall_times), 1), 'max': max(wall_times or [0])},
+           'decisions': [invocation for invocation in invocations if invocation['action'] not in [None, "none"]],
+           'results-by-reason': dict(collections.Counter(str(invocation['reason']) for invocation in invocations)),
+           'time-to-capacity': time_to_capacity,
+           'time-to-converge': max(last_node_change - last_load_change, 0),
+           'node-minutes': node_minutes,
+           'pending-pod-minutes': pending_pod_minutes,
+           'evicted-pods': cluster.evictions,
+           'final-node-count': len(cluster.live_nodes())}
+
+def main():
+   parser = argparse.ArgumentParser(description="Replay a load trace through the oke-autoscaler function against fake backends.")
+   parser.add_argument('--trace', default="burst", help="burst, batch, diurnal or a JSON file of replicas per minute")
+   parser.add_argument('--days', type=int, default=1, help="days of the diurnal trace")
+   parser.add_argument('--interval', type=int, default=3, help="minutes between function invocations")
+   parser.add_argument('--latency', type=float, default=0.0, help="seconds of latency injected into each OCI api call")
+   parser.add_argument('--failure-rate', type=float, default=0.0, help="fraction of OCI api calls which fail")
+   parser.add_argument('--failure-status', type=int, default=500, help="http status of injected failures")
+   parser.add_argument('--scripted-failures', type=json.loads, default=None, metavar="JSON",
+                       help="statuses of successive calls by operation, e.g. '{\"monitoring.summarize_metrics_data\": [429, 429, null]}'")
+   parser.add_argument('--nodes', type=int, default=2, help="initial node pool size")
+   parser.add_argument('--pdb-max-unavailable', type=int, default=None, help="give the workload a PodDisruptionBudget")
+   parser.add_argument('--pod-removal', default="newest", help="pods removed when the workload scales in: newest or random")
+   parser.add_argument('--set', action='append', default=[], metavar="KEY=VALUE", help="function configuration override")
+   parser.add_argument('--decisions', action='store_true', help="include each scaling decision in the report")
+   args = parser.parse_args()
+
+   config = dict(setting.split("=", 1) for setting in args.set)
+   report = simulate(load_trace(args.trace, args.days), args.interval, config,
+                     {'node_count': args.nodes, 'latency': args.latency, 'failure_rate': args.failure_rate, 'failure_status': args.failure_status,
+                      'scripted_failures': args.scripted_failures,
+                      'pdb_max_unavailable': args.pdb_max_unavailable, 'pod_removal': args.pod_removal})
+   if not args.decisions:
+      report['decisions'] = len(report['decisions'])
+   print(json.dumps(report, indent=3))
+
+if __name__ == "__main__":
+   main()
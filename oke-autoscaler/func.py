@@ -1,21 +1,71 @@
 import time
-import pendulum
+import datetime
 import oci
 import os
+import sys
 import base64
-import gzip
-import shutil
 import io
+import re
+import ssl
 import json
-import csv
-import zipfile
-import subprocess
-from subprocess import Popen
+import math
+import random
+import array
+import threading
+import contextlib
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from fdk import response
 import logging
 
 # general configuration..
-logging.basicConfig(level=logging.INFO)
+#   - oci service modules (oci.container_engine, oci.core, ..) are loaded by the sdk on first use, and
+#     numpy only where forecasting is enabled, to keep container cold starts short..
+# the fdk configures the root logger at DEBUG level when imported, so set the level explicitly..
+logging.basicConfig()
+logging.getLogger().setLevel(os.environ.get('log_level', "INFO").upper())
+
+# warm container cache:
+#   - signer, api clients, service account token & kubeconfig are retained between invocations
+#     handled by the same function container, for up to cache_ttl seconds (by kind)..
+cache = {}
+cache_stats = {'hits': 0, 'misses': 0}
+cache_lock = threading.Lock()
+cache_key_locks = {}
+cache_ttl = {'signer': 600, 'client': 3600, 'secret': 300, 'kubeconfig': 3600, 'shapes': 86400}
+
+# kubernetes resource quantity suffixes..
+quantity_suffixes = [('Ki', 1024), ('Mi', 1024 ** 2), ('Gi', 1024 ** 3), ('Ti', 1024 ** 4), ('Pi', 1024 ** 5), ('Ei', 1024 ** 6),
+                     ('n', 1e-9), ('u', 1e-6), ('m', 1e-3), ('k', 1e3), ('M', 1e6), ('G', 1e9), ('T', 1e12), ('P', 1e15), ('E', 1e18)]
+
+# invocation instrumentation:
+#   - phase durations, and api calls & retries by service, recorded from the start of each invocation..
+timings = {'phases': {}, 'api-calls': {}, 'retries': {}}
+timings_lock = threading.Lock()
+
+# oci api client layer:
+#   - calls throttled (429), failed (5xx) or timed out are retried with jittered exponential backoff, other than
+#     5xx failures & read timeouts of operations which are not safe to repeat..
+#   - calls to each service are rate limited by a token bucket, shared by all node pools & invocations handled
+#     by the same function container - its capacity allowing the calls of a node pool's inspection to be made
+#     at full concurrency..
+#   - no call is started or retried after the invocation deadline, deadline_ratio of the time remaining before
+#     the deadline of the fdk invoke context (or of the function_timeout configured, without a context), and
+#     node drains end drain_deadline_reserve of that time earlier, leaving time to delete or uncordon the nodes..
+client_services = {'ContainerEngineClient': "container_engine", 'ComputeClient': "compute", 'MonitoringClient': "monitoring",
+                   'SecretsClient': "secrets", 'ObjectStorageClient': "object_storage"}
+non_idempotent_operations = ['delete_node']
+deadline_ratio = 0.9
+drain_deadline_reserve = 0.1
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+invocation = {'deadline': None, 'timeout': None}
+
+# node metrics history:
+#   - minutes of 1 minute samples re-fetched on each update, to pick up late ingested datapoints..
+metrics_history_refetch = 2
 
 # functions..
 def handler(ctx, data: io.BytesIO=None):
@@ -23,12 +73,385 @@ def handler(ctx, data: io.BytesIO=None):
    handler
    Handler function invoked by Oracle Functions service.
    """
-   signer = oci.auth.signers.get_resource_principals_signer()
-   resp = do(signer)
+   cache_stats['hits'] = 0
+   cache_stats['misses'] = 0
+   timeout = get_invocation_timeout(ctx)
+   deadline = get_deadline(time.monotonic(), timeout)
+   try:
+      signer = get_cached('signer', 'signer', oci.auth.signers.get_resource_principals_signer)
+      resp = do(signer, deadline, timeout)
+   except Exception as e:
+      if not is_auth_error(e):
+         raise
+      # cached credentials rejected, rebuild everything and retry once..
+      logging.info("Authentication error, invalidating cache: " + str(e))
+      invalidate_cache()
+      signer = get_cached('signer', 'signer', oci.auth.signers.get_resource_principals_signer)
+      resp = do(signer, deadline, timeout)
    return response.Response(ctx,
       response_data=json.dumps(resp),
       headers={"Content-Type": "application/json"})
 
+def get_cached(key, kind, loader):
+   """
+   get_cached
+   Return the cached value for key, calling loader to populate the cache where the entry is
+   missing or has outlived the ttl for its kind.
+   """
+   with cache_lock:
+      key_lock = cache_key_locks.setdefault(key, threading.Lock())
+
+   # concurrent callers of the same key wait for a single load..
+   with key_lock:
+      now = time.monotonic()
+      with cache_lock:
+         entry = cache.get(key)
+         if entry is not None and now < entry[1]:
+            cache_stats['hits'] += 1
+            return entry[0]
+         cache_stats['misses'] += 1
+         # drop expired entries, e.g. clients built for a previous signer..
+         for expired_key in [k for k, v in cache.items() if now >= v[1]]:
+            del cache[expired_key]
+
+      value = loader()
+      ttl = int(os.environ.get('cache_ttl_' + kind, cache_ttl[kind]))
+      with cache_lock:
+         cache[key] = (value, time.monotonic() + ttl)
+
+   return value
+
+def get_shared(shared, key, loader):
+   """
+   get_shared
+   Return the value for key from the state shared by the node pools evaluated in an invocation,
+   calling loader once to populate it.
+   """
+   with shared['lock']:
+      key_lock = shared['locks'].setdefault(key, threading.Lock())
+
+   with key_lock:
+      if key not in shared['values']:
+         shared['values'][key] = loader()
+
+   return shared['values'][key]
+
+def invalidate_cache():
+   """
+   invalidate_cache
+   Discard all cached signers, clients, secrets & kubeconfigs.
+   """
+   with cache_lock:
+      cache.clear()
+
+   return
+
+def is_auth_error(e):
+   """
+   is_auth_error
+   Determine if an exception raised by an oci or kubernetes api call is an authentication failure.
+   """
+   if isinstance(e, oci.exceptions.ServiceError):
+      return e.status == 401
+   if isinstance(e, urllib.error.HTTPError):
+      return e.code == 401
+
+   return False
+
+def reset_timings():
+   """
+   reset_timings
+   Clear the recorded phase durations, api calls & retries.
+   """
+   with timings_lock:
+      for values in timings.values():
+         values.clear()
+
+   return
+
+@contextlib.contextmanager
+def timed_phase(phase):
+   """
+   timed_phase
+   Record the duration of a phase of the invocation, accumulated where the phase runs more than once.
+   """
+   start = time.monotonic()
+   try:
+      yield
+   finally:
+      duration = time.monotonic() - start
+      with timings_lock:
+         timings['phases'][phase] = timings['phases'].get(phase, 0) + duration
+
+def count_api_call(service, retries=0):
+   """
+   count_api_call
+   Record an api call made to the specified service, and the number of times it was retried.
+   """
+   with timings_lock:
+      timings['api-calls'][service] = timings['api-calls'].get(service, 0) + 1
+      if retries:
+         timings['retries'][service] = timings['retries'].get(service, 0) + retries
+
+   return
+
+def get_timings(total):
+   """
+   get_timings
+   Returns the recorded phase durations (in seconds), api calls & retries, and the total duration.
+   """
+   with timings_lock:
+      return {'total': round(total, 3),
+              'phases': {phase: round(duration, 3) for phase, duration in timings['phases'].items()},
+              'api-calls': dict(timings['api-calls']),
+              'retries': dict(timings['retries'])}
+
+def publish_timings(signer, compartment_id, namespace, timings_data):
+   """
+   publish_timings
+   Publish the invocation timings as custom metrics, in a single call to the monitoring service.
+   """
+   timestamp = utc_now()
+   metrics = [("InvocationDuration", {'phase': "total"}, timings_data['total'], "seconds")]
+   metrics += [("PhaseDuration", {'phase': phase}, duration, "seconds") for phase, duration in timings_data['phases'].items()]
+   metrics += [("ApiCalls", {'service': service}, count, "count") for service, count in timings_data['api-calls'].items()]
+   metrics += [("ApiRetries", {'service': service}, count, "count") for service, count in timings_data['retries'].items()]
+   metric_data = [oci.monitoring.models.MetricDataDetails(namespace=namespace, compartment_id=compartment_id, name=name, dimensions=dimensions,
+                                                          datapoints=[oci.monitoring.models.Datapoint(timestamp=timestamp, value=value)],
+                                                          metadata={'unit': unit})
+                  for name, dimensions, value, unit in metrics]
+
+   # custom metrics are posted to the telemetry ingestion endpoint..
+   region = os.environ.get('metrics_region', getattr(signer, 'region', None))
+   monitoring_client = get_client(signer, oci.monitoring.MonitoringClient, service_endpoint="https://telemetry-ingestion." + region + ".oraclecloud.com")
+   monitoring_client.post_metric_data(oci.monitoring.models.PostMetricDataDetails(metric_data=metric_data))
+
+   return
+
+def log_json(message, data):
+   """
+   log_json
+   Log data as indented JSON at debug level, avoiding the cost of serialization at other levels.
+   """
+   if logging.getLogger().isEnabledFor(logging.DEBUG):
+      logging.debug(message + json.dumps(data, indent=4))
+
+   return
+
+def utc_now():
+   """
+   utc_now
+   Returns the current time, in UTC.
+   """
+   return datetime.datetime.now(datetime.timezone.utc)
+
+def parse_time(timestamp):
+   """
+   parse_time
+   Parse an ISO 8601 timestamp, as returned by the oci apis.
+   """
+   #   - fromisoformat accepts neither a Z suffix, nor fractional seconds other than 3 or 6 digits..
+   timestamp = re.sub(r'\.(\d+)', lambda match: "." + (match.group(1) + "000000")[:6], timestamp.replace("Z", "+00:00"))
+   return datetime.datetime.fromisoformat(timestamp)
+
+def get_client(signer, client_class, **kwargs):
+   """
+   get_client
+   Get an oci api client of the specified class, cached (along with its http connection pool) per signer.
+   The client's operations are made through call_api.
+   """
+   key = client_class.__name__ + ':' + str(id(signer)) + ''.join(':' + str(kwargs[k]) for k in sorted(kwargs))
+   return get_cached(key, 'client', lambda: ServiceClient(create_client(signer, client_class, **kwargs), client_services[client_class.__name__]))
+
+def create_client(signer, client_class, **kwargs):
+   """
+   create_client
+   Create an oci api client of the specified class, with the sdk's own retries disabled.
+   """
+   return client_class({}, signer=signer, retry_strategy=oci.retry.NoneRetryStrategy(), **kwargs)
+
+class ServiceClient(object):
+   """
+   ServiceClient
+   Wraps an oci api client, so that each operation is made through call_api.
+   """
+   def __init__(self, client, service):
+      self.client = client
+      self.service = service
+
+   def __getattr__(self, name):
+      attribute = getattr(self.client, name)
+      if name.startswith('_') or not callable(attribute):
+         return attribute
+      return lambda *args, **kwargs: call_api(self.client, self.service, name, *args, **kwargs)
+
+def get_invocation_timeout(ctx):
+   """
+   get_invocation_timeout
+   Returns the seconds remaining before the deadline of the fdk invoke context, or the function timeout
+   (function_timeout seconds, as configured in func.yaml) where the context has no valid deadline.
+   """
+   try:
+      deadline = parse_time(ctx.Deadline())
+      return max((deadline - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0)
+   except (AttributeError, TypeError, ValueError):
+      return float(os.environ.get('function_timeout', 120))
+
+def get_deadline(start, timeout=None):
+   """
+   get_deadline
+   Returns the deadline of an invocation started at start, deadline_ratio of its timeout later - by default
+   the function timeout (function_timeout seconds, as configured in func.yaml).
+   """
+   if timeout is None:
+      timeout = float(os.environ.get('function_timeout', 120))
+
+   return start + deadline_ratio * timeout
+
+class DeadlineExceeded(Exception):
+   """
+   DeadlineExceeded
+   Raised where an api call would be started, or retried, after the invocation deadline.
+   """
+
+def set_deadline(deadline, timeout=None):
+   """
+   set_deadline
+   Set the invocation deadline (a time.monotonic() value) and the timeout it was set from, by default the
+   function timeout - or clear them where deadline is None.
+   """
+   invocation['deadline'] = deadline
+   invocation['timeout'] = timeout
+
+   return
+
+def time_remaining():
+   """
+   time_remaining
+   Returns the seconds remaining before the invocation deadline, or None where no deadline is set.
+   """
+   deadline = invocation['deadline']
+   if deadline is None:
+      return None
+
+   return deadline - time.monotonic()
+
+def call_timeout(timeout, operation):
+   """
+   call_timeout
+   Returns the timeout for a call, cut to the time remaining before the invocation deadline.
+   Raises DeadlineExceeded where the deadline has passed.
+   """
+   remaining = time_remaining()
+   if remaining is None:
+      return timeout
+   if remaining <= 0:
+      raise DeadlineExceeded("Invocation deadline exceeded before " + operation)
+
+   return min(timeout, remaining)
+
+def acquire_rate_limit(service):
+   """
+   acquire_rate_limit
+   Take a token from the service's token bucket, of api_rate_burst tokens refilled at api_rate_limit
+   tokens each second, waiting where the bucket is empty.
+   """
+   rate = float(os.environ.get('api_rate_limit', 10))
+   if rate <= 0:
+      return
+   capacity = max(float(os.environ.get('api_rate_burst', 200)), 1)
+   with rate_limiters_lock:
+      now = time.monotonic()
+      bucket = rate_limiters.setdefault(service, {'tokens': capacity, 'updated': now})
+      bucket['tokens'] = min(bucket['tokens'] + (now - bucket['updated']) * rate, capacity) - 1
+      bucket['updated'] = now
+      wait = -bucket['tokens'] / rate
+
+   # wait for the reserved token, returning it where the deadline would pass first..
+   if wait > 0:
+      remaining = time_remaining()
+      if remaining is not None and wait >= remaining:
+         with rate_limiters_lock:
+            bucket['tokens'] += 1
+         raise DeadlineExceeded("Invocation deadline exceeded waiting for the rate limit of " + service)
+      time.sleep(wait)
+
+   return
+
+def is_retryable_error(e, operation):
+   """
+   is_retryable_error
+   Determine if a failed oci api call may be retried: throttled calls, and calls which failed or
+   timed out - where the operation is safe to repeat.
+   """
+   if isinstance(e, oci.exceptions.ServiceError):
+      return e.status == 429 or (e.status >= 500 and operation not in non_idempotent_operations)
+   if isinstance(e, oci.exceptions.ConnectTimeout):
+      return True
+   if isinstance(e, oci.exceptions.RequestException):
+      return operation not in non_idempotent_operations
+
+   return False
+
+def call_api(client, service, operation, *args, **kwargs):
+   """
+   call_api
+   Call an operation of an oci api client, rate limited per service, and retried with jittered exponential
+   backoff (up to api_max_retries times) while the call is retryable and the invocation deadline allows.
+   The attempts made, i.e. the call and its retries, are recorded against the service - not calls
+   which are never sent, as the rate limit or the deadline would be exceeded first.
+   """
+   api_max_retries = int(os.environ.get('api_max_retries', 4))
+   api_retry_base_delay = float(os.environ.get('api_retry_base_delay', 1))
+   api_retry_max_delay = float(os.environ.get('api_retry_max_delay', 16))
+   method = getattr(client, operation)
+   base_client = getattr(client, 'base_client', None)
+   retries = 0
+   attempts = 0
+   try:
+      while True:
+         acquire_rate_limit(service)
+         # cut the connect & read timeouts to the time remaining..
+         timeout = (call_timeout(10, operation), call_timeout(60, operation))
+         if base_client is not None:
+            base_client.timeout = timeout
+         try:
+            attempts += 1
+            return method(*args, **kwargs)
+         except Exception as e:
+            if retries >= api_max_retries or not is_retryable_error(e, operation):
+               raise
+            # full jitter, or as requested by the service..
+            delay = random.uniform(0, min(api_retry_base_delay * 2 ** retries, api_retry_max_delay))
+            retry_after = str((getattr(e, 'headers', None) or {}).get('retry-after', ""))
+            if retry_after.isdigit():
+               delay = max(delay, float(retry_after))
+            error = str(e.status) + " " + str(e.code) if isinstance(e, oci.exceptions.ServiceError) else type(e).__name__
+            remaining = time_remaining()
+            if remaining is not None and delay >= remaining:
+               raise DeadlineExceeded("Invocation deadline exceeded retrying " + service + "." + operation + " (" + error + ")") from e
+            logging.info("Retrying " + service + "." + operation + " in " + str(round(delay, 2)) + "s: " + error)
+            time.sleep(delay)
+            retries += 1
+   finally:
+      if attempts:
+         count_api_call(service, attempts - 1)
+
+def get_cluster_kube_api(ce_client, secrets_client, cluster_id, secret_id):
+   """
+   get_cluster_kube_api
+   Get the kubernetes api server connection details for a cluster, from the cached kubeconfig
+   and service account token.
+   """
+   #   - get kubernetes service account token from oci secret in vault..
+   with timed_phase("secret"):
+      secret = get_cached('secret:' + secret_id, 'secret', lambda: get_secret(secrets_client, secret_id))
+   #   - get kubeconfig..
+   with timed_phase("kubeconfig"):
+      kubeconfig = get_cached('kubeconfig:' + cluster_id, 'kubeconfig', lambda: get_kubeconfig(ce_client, cluster_id))
+
+   return get_cached('kube_api:' + cluster_id + ':' + secret_id, 'secret', lambda: get_kube_api(kubeconfig, secret))
+
 def get_node_pool_details(ce_client, node_pool_id):
    """
    get_node_pool_details
@@ -53,15 +476,434 @@ def summarize_metrics_data(monitoring_client, compartment_id, namespace, query,
 
    return response
 
-def update_node_pool(ce_client, node_pool_id, availability_domain, subnet_id, node_pool_new_size):
+def get_nodes_metric_datapoints(monitoring_client, compartment_id, namespace, metric, node_ids, monitoring_resolution, query_start_time, query_end_time, query_resolution, batch_size, executor=None):
+   """
+   get_nodes_metric_datapoints
+   Returns the aggregated datapoints of a metric for each of the specified nodes, keyed by node id.
+   Nodes are queried in batches of up to batch_size resource ids per query, with the aggregated data
+   returned per resourceId dimension - nodes without datapoints are omitted. Also returns the number
+   of monitoring api calls made. Where an executor is provided, the batched queries are run concurrently.
+   """
+   def query_batch(batch):
+      query = metric + "[" + monitoring_resolution + "]{resourceId =~ \"" + "|".join(batch) + "\"}.mean()"
+      monitoring_response = summarize_metrics_data(monitoring_client, compartment_id, namespace, query, query_start_time, query_end_time, query_resolution)
+      # split the oci monitoring aggregated datapoints by resourceId..
+      batch_datapoints = {}
+      monitoring = json.loads(str(monitoring_response.data))
+      for metric_data in monitoring:
+         node_id = metric_data['dimensions'].get('resourceId')
+         if node_id in batch and node_id not in batch_datapoints:
+            if metric_data['aggregated_datapoints']:
+               batch_datapoints[node_id] = metric_data['aggregated_datapoints']
+      return batch_datapoints
+
+   batches = [node_ids[i:i + batch_size] for i in range(0, len(node_ids), batch_size)]
+   nodes_datapoints = {}
+   for batch_datapoints in (executor.map(query_batch, batches) if executor else map(query_batch, batches)):
+      nodes_datapoints.update(batch_datapoints)
+
+   return nodes_datapoints, len(batches)
+
+def get_nodes_metric(monitoring_client, compartment_id, namespace, metric, node_ids, monitoring_resolution, query_start_time, query_end_time, query_resolution, batch_size, executor=None):
+   """
+   get_nodes_metric
+   Returns the aggregated datapoint of a metric for each of the specified nodes, keyed by node id,
+   queried in batches of nodes. Also returns the number of monitoring api calls made.
+   """
+   nodes_datapoints, api_calls = get_nodes_metric_datapoints(monitoring_client, compartment_id, namespace, metric, node_ids, monitoring_resolution, query_start_time, query_end_time, query_resolution, batch_size, executor)
+   nodes_metric = {node_id: datapoints[0]['value'] for (node_id, datapoints) in nodes_datapoints.items()}
+
+   # fall back to a per-node query for any node missing from the batched response..
+   for node_id in node_ids:
+      if node_id not in nodes_metric:
+         query = metric + "[" + monitoring_resolution + "]{resourceId=" + node_id + "}.mean()"
+         monitoring_response = summarize_metrics_data(monitoring_client, compartment_id, namespace, query, query_start_time, query_end_time, query_resolution)
+         api_calls += 1
+         monitoring = json.loads(str(monitoring_response.data))
+         nodes_metric[node_id] = (monitoring[0]['aggregated_datapoints'][0]['value'])
+
+   return nodes_metric, api_calls
+
+def epoch_minute(timestamp):
+   """
+   epoch_minute
+   Returns the number of whole minutes between the unix epoch and the timestamp.
+   """
+   return int(timestamp.timestamp()) // 60
+
+def load_metrics_history(state_store, node_pool_id, history_window):
+   """
+   load_metrics_history
+   Load the node pool's node metrics history from the state store: for each node, ring buffers of
+   history_window 1 minute cpu & ram utilization samples (float32, NaN where no sample was recorded),
+   and the minute of the newest sample. History saved with a different window is discarded.
+   """
+   metrics_history = load_state(state_store, node_pool_id + ".metrics")
+   if metrics_history.get('window') != history_window:
+      return {'window': history_window, 'fetched': None, 'nodes': {}}
+   for node_history in metrics_history['nodes'].values():
+      for metric in ['cpu', 'ram']:
+         samples = array.array('f')
+         samples.frombytes(base64.b64decode(node_history[metric]))
+         node_history[metric] = samples
+
+   return metrics_history
+
+def save_metrics_history(state_store, node_pool_id, metrics_history):
+   """
+   save_metrics_history
+   Save the node pool's node metrics history to the state store, with each ring buffer base64 encoded.
+   """
+   nodes = {node_id: {'last': node_history['last'],
+                      'cpu': base64.b64encode(node_history['cpu'].tobytes()).decode('utf-8'),
+                      'ram': base64.b64encode(node_history['ram'].tobytes()).decode('utf-8')}
+            for (node_id, node_history) in metrics_history['nodes'].items()}
+   save_state(state_store, node_pool_id + ".metrics", dict(metrics_history, nodes=nodes))
+
+   return
+
+def record_metric_sample(node_history, window, metric, minute, value):
+   """
+   record_metric_sample
+   Record a node's 1 minute utilization sample in its ring buffer. Moving the ring buffer forward
+   clears the slots of any minutes skipped since the newest sample, so gaps in the metric data are
+   never read as stale samples. Samples older than the window are ignored.
+   """
+   last = node_history['last']
+   if last is None or minute > last:
+      first = minute - window + 1 if last is None else max(last + 1, minute - window + 1)
+      for cleared in range(first, minute + 1):
+         node_history['cpu'][cleared % window] = math.nan
+         node_history['ram'][cleared % window] = math.nan
+      node_history['last'] = minute
+   elif minute <= last - window:
+      return
+   node_history[metric][minute % window] = value
+
+   return
+
+def update_metrics_history(monitoring_client, compartment_id, metrics_history, node_ids, time_now, batch_size, executor=None):
+   """
+   update_metrics_history
+   Bring the node metrics history up to date: evict nodes no longer in the node pool, then fetch the
+   1 minute cpu & ram utilization of each node since the last successful fetch (re-fetching the last
+   few minutes, to pick up late ingested datapoints), batched across all nodes.
+   Returns the number of monitoring api calls made.
+   """
+   window = metrics_history['window']
+   now_minute = epoch_minute(time_now)
+   # evict deleted nodes, & start history for new nodes..
+   for node_id in list(metrics_history['nodes']):
+      if node_id not in node_ids:
+         del metrics_history['nodes'][node_id]
+   for node_id in node_ids:
+      if node_id not in metrics_history['nodes']:
+         metrics_history['nodes'][node_id] = {'last': None, 'cpu': array.array('f', [math.nan]) * window, 'ram': array.array('f', [math.nan]) * window}
+
+   start_minute = now_minute - window
+   if metrics_history['fetched'] is not None:
+      start_minute = max(start_minute, metrics_history['fetched'] - metrics_history_refetch)
+   query_start_time = (time_now - datetime.timedelta(minutes=(now_minute - start_minute))).isoformat()
+   query_end_time = time_now.isoformat()
+
+   api_calls = 0
+   for (metric, key) in [("CpuUtilization", 'cpu'), ("MemoryUtilization", 'ram')]:
+      nodes_datapoints, metric_api_calls = get_nodes_metric_datapoints(monitoring_client, compartment_id, "oci_computeagent", metric, node_ids, "1m", query_start_time, query_end_time, "1m", batch_size, executor)
+      api_calls += metric_api_calls
+      for (node_id, datapoints) in nodes_datapoints.items():
+         for datapoint in datapoints:
+            record_metric_sample(metrics_history['nodes'][node_id], window, key, epoch_minute(parse_time(datapoint['timestamp'])), datapoint['value'])
+   metrics_history['fetched'] = now_minute
+
+   return api_calls
+
+def get_metric_statistic(node_history, window, metric, now_minute, minutes, statistic):
+   """
+   get_metric_statistic
+   Returns the mean (statistic "mean") or a percentile (e.g. statistic "p95") of a node's utilization
+   samples over the last minutes, or None where the node has no samples in that period.
+   """
+   last = node_history['last']
+   if last is None:
+      return None
+   values = [node_history[metric][minute % window] for minute in range(max(now_minute - minutes, last - window) + 1, min(now_minute, last) + 1)]
+   values = sorted(value for value in values if not math.isnan(value))
+   if not values:
+      return None
+   if statistic == "mean":
+      return sum(values) / len(values)
+   # nearest-rank percentile..
+   percentile = float(statistic.lstrip("p"))
+   return values[max(int(math.ceil(percentile / 100 * len(values))) - 1, 0)]
+
+def inspect_nodes(compute_client, monitoring_client, compartment_id, nodes, monitoring_resolution, query_start_time, query_end_time, query_resolution, batch_size, concurrency,
+                  metrics_history=None, time_now=None, scale_down_window=None, scale_down_statistic="mean"):
+   """
+   inspect_nodes
+   Discover and inspect each node in the node pool, fanning the compute and monitoring api calls
+   out across a pool of at most concurrency worker threads.
+   Where metrics_history is provided, it is brought up to date and each node's cpu & ram load is the
+   scale_down_statistic of its samples over the last scale_down_window minutes - falling back to the
+   aggregated utilization over the query period for nodes without samples in that window.
+   Returns the nodes_data dict, populated with node attributes: name, id, created, cpu_load, ram_load.
+   """
+   node_index = [i for i in range(len(nodes)) if (nodes[i]['lifecycle_state']) != "DELETED"]
+   node_ids = [nodes[i]['id'] for i in node_index]
+   namespace = "oci_computeagent"
+
+   with ThreadPoolExecutor(max_workers=concurrency) as executor:
+      # get node details from compute client..
+      instance_futures = {i: executor.submit(evaluate_node, compute_client, nodes[i]['id']) for i in node_index}
+      # get node cpu & ram utilisation data from monitoring service, batched across all nodes:
+      with timed_phase("metrics"):
+         api_calls = 0
+         nodes_cpu_load = {}
+         nodes_ram_load = {}
+         #   - from the node metrics history, fetching only the period since the last fetch..
+         if metrics_history is not None:
+            api_calls += update_metrics_history(monitoring_client, compartment_id, metrics_history, node_ids, time_now, batch_size, executor)
+            now_minute = epoch_minute(time_now)
+            for node_id in node_ids:
+               node_history = metrics_history['nodes'][node_id]
+               cpu_load = get_metric_statistic(node_history, metrics_history['window'], 'cpu', now_minute, scale_down_window, scale_down_statistic)
+               ram_load = get_metric_statistic(node_history, metrics_history['window'], 'ram', now_minute, scale_down_window, scale_down_statistic)
+               if cpu_load is not None and ram_load is not None:
+                  nodes_cpu_load[node_id] = cpu_load
+                  nodes_ram_load[node_id] = ram_load
+         #   - otherwise, aggregated over the query period..
+         query_node_ids = [node_id for node_id in node_ids if node_id not in nodes_cpu_load]
+         if query_node_ids:
+            query_cpu_load, cpu_api_calls = get_nodes_metric(monitoring_client, compartment_id, namespace, "CpuUtilization", query_node_ids, monitoring_resolution, query_start_time, query_end_time, query_resolution, batch_size, executor)
+            query_ram_load, ram_api_calls = get_nodes_metric(monitoring_client, compartment_id, namespace, "MemoryUtilization", query_node_ids, monitoring_resolution, query_start_time, query_end_time, query_resolution, batch_size, executor)
+            nodes_cpu_load.update(query_cpu_load)
+            nodes_ram_load.update(query_ram_load)
+            api_calls += cpu_api_calls + ram_api_calls
+      logging.info("Monitoring API Calls: " + str(api_calls))
+
+      nodes_data = {}
+      for i in node_index:
+         log_json('Node Data: ', nodes[i])
+         node_id = (nodes[i]['id'])
+         instance = json.loads(str(instance_futures[i].result().data))
+         # insert node data into nodes_data dict..
+         nodes_data[i] = {'name': nodes[i]['private_ip'], 'id': node_id, 'created': instance['time_created'], 'cpu_load': nodes_cpu_load[node_id], 'ram_load': nodes_ram_load[node_id]}
+
+   return nodes_data
+
+def get_node_shape_capacity(compute_client, node_pool_details, allocatable_ratio):
+   """
+   get_node_shape_capacity
+   Returns the cpu (cores) and memory (bytes) allocatable to pods on a node of the node pool's shape.
+   Flexible shapes are sized from the node pool shape config, fixed shapes from the compute shape list.
+   """
+   node_shape = node_pool_details['node_shape']
+   node_shape_config = node_pool_details.get('node_shape_config') or {}
+   if node_shape_config.get('ocpus') and node_shape_config.get('memory_in_gbs'):
+      ocpus = node_shape_config['ocpus']
+      memory_in_gbs = node_shape_config['memory_in_gbs']
+   else:
+      compartment_id = node_pool_details['compartment_id']
+      shapes = get_cached('shapes:' + compartment_id, 'shapes', lambda: list_shapes(compute_client, compartment_id))
+      shape = next(shape for shape in shapes if shape.shape == node_shape)
+      ocpus = shape.ocpus
+      memory_in_gbs = shape.memory_in_gbs
+
+   # an ocpu is a single core on ampere (arm) shapes, and two hardware threads otherwise..
+   vcpus_per_ocpu = 1 if re.search(r'\.A\d', node_shape) else 2
+   node_cpu = ocpus * vcpus_per_ocpu * allocatable_ratio
+   node_memory = memory_in_gbs * 1024 ** 3 * allocatable_ratio
+
+   return node_cpu, node_memory
+
+def list_shapes(compute_client, compartment_id):
+   """
+   list_shapes
+   List the compute shapes available in the specified compartment.
+   """
+   # paged here, as the sdk's pagination helpers retry each page themselves..
+   shapes = []
+   page = None
+   while True:
+      response = compute_client.list_shapes(compartment_id, page=page)
+      shapes.extend(response.data)
+      if not response.has_next_page:
+         return shapes
+      page = response.next_page
+
+def parse_quantity(quantity):
+   """
+   parse_quantity
+   Convert a kubernetes resource quantity (e.g. 250m, 1.5, 512Mi, 1G) to a number.
+   """
+   quantity = str(quantity)
+   for suffix, multiplier in quantity_suffixes:
+      if quantity.endswith(suffix):
+         return float(quantity[:-len(suffix)]) * multiplier
+
+   return float(quantity)
+
+def get_pod_requests(pod):
+   """
+   get_pod_requests
+   Returns the cpu (cores) and memory (bytes) requested by a pod, i.e. the greater of the sum of
+   its container requests and the largest init container request, plus any pod overhead.
+   """
+   def requests(container, resource):
+      return parse_quantity(((container.get('resources') or {}).get('requests') or {}).get(resource, 0))
+
+   spec = pod.get('spec', {})
+   containers = spec.get('containers') or []
+   init_containers = spec.get('initContainers') or []
+   overhead = spec.get('overhead') or {}
+   pod_requests = []
+   for resource in ["cpu", "memory"]:
+      containers_request = sum(requests(container, resource) for container in containers)
+      init_containers_request = max([requests(container, resource) for container in init_containers] or [0])
+      pod_requests.append(max(containers_request, init_containers_request) + parse_quantity(overhead.get(resource, 0)))
+
+   return pod_requests[0], pod_requests[1]
+
+def bin_pack_pods(pods_requests, node_cpu, node_memory, node_max_pods):
+   """
+   bin_pack_pods
+   Estimate the number of nodes required to schedule pods with the specified (cpu, memory) requests,
+   using first-fit decreasing bin packing, with at most node_max_pods pods per node. Returns the
+   number of nodes required, and the number of pods which would not fit on an empty node.
+   """
+   # place the largest pods first, ranked by their dominant resource..
+   pods_requests = sorted(pods_requests, key=lambda r: max(r[0] / node_cpu, r[1] / node_memory), reverse=True)
+   nodes_free_cpu = []
+   nodes_free_memory = []
+   nodes_free_pods = []
+   unfit_pods = 0
+   for pod_cpu, pod_memory in pods_requests:
+      if pod_cpu > node_cpu or pod_memory > node_memory:
+         unfit_pods += 1
+         continue
+      for i in range(len(nodes_free_cpu)):
+         if pod_cpu <= nodes_free_cpu[i] and pod_memory <= nodes_free_memory[i] and nodes_free_pods[i] > 0:
+            nodes_free_cpu[i] -= pod_cpu
+            nodes_free_memory[i] -= pod_memory
+            nodes_free_pods[i] -= 1
+            break
+      else:
+         nodes_free_cpu.append(node_cpu - pod_cpu)
+         nodes_free_memory.append(node_memory - pod_memory)
+         nodes_free_pods.append(node_max_pods - 1)
+
+   return len(nodes_free_cpu), unfit_pods
+
+def get_scale_up_size(compute_client, node_pool_details, unsched_pods, allocatable_ratio, node_max_pods):
+   """
+   get_scale_up_size
+   Returns the number of nodes to add to the node pool in order to schedule the unschedulable pods,
+   or 1 where the node shape capacity cannot be determined.
+   """
+   try:
+      node_cpu, node_memory = get_node_shape_capacity(compute_client, node_pool_details, allocatable_ratio)
+   except Exception as e:
+      logging.info("Unable to determine node shape capacity, adding a single node: " + str(e))
+      return 1
+
+   pods_requests = [get_pod_requests(pod) for pod in unsched_pods]
+   nodes_required, unfit_pods = bin_pack_pods(pods_requests, node_cpu, node_memory, node_max_pods)
+   logging.info("Nodes Required: " + str(nodes_required) + ", Pods Exceeding Node Capacity: " + str(unfit_pods))
+
+   return max(nodes_required, 1)
+
+def load_demand_history(state_store, node_pool_id):
+   """
+   load_demand_history
+   Load the node pool's demand history from the state store: the minute & demand (in nodes) of each
+   sample, as int32 & float32 arrays.
+   """
+   demand_history = load_state(state_store, node_pool_id + ".demand")
+   minutes = array.array('i')
+   demand = array.array('f')
+   if demand_history:
+      minutes.frombytes(base64.b64decode(demand_history['minutes']))
+      demand.frombytes(base64.b64decode(demand_history['demand']))
+
+   return {'minutes': minutes, 'demand': demand}
+
+def save_demand_history(state_store, node_pool_id, demand_history):
+   """
+   save_demand_history
+   Save the node pool's demand history to the state store, with each array base64 encoded.
+   """
+   save_state(state_store, node_pool_id + ".demand", {'minutes': base64.b64encode(demand_history['minutes'].tobytes()).decode('utf-8'),
+                                                      'demand': base64.b64encode(demand_history['demand'].tobytes()).decode('utf-8')})
+
+   return
+
+def record_demand_sample(demand_history, minute, demand, retention):
+   """
+   record_demand_sample
+   Record the node pool's demand at minute, replacing any sample for the same minute, and evict
+   samples older than retention minutes.
+   """
+   minutes = demand_history['minutes']
+   if minutes and minutes[-1] >= minute:
+      # replace samples at or after minute (e.g. replayed), keeping the history in order..
+      keep = len([sample_minute for sample_minute in minutes if sample_minute < minute])
+      del minutes[keep:]
+      del demand_history['demand'][keep:]
+   minutes.append(minute)
+   demand_history['demand'].append(demand)
+   evict = len([sample_minute for sample_minute in minutes if sample_minute <= minute - retention])
+   del minutes[:evict]
+   del demand_history['demand'][:evict]
+
+   return
+
+def forecast_demand(demand_history, now_minute, lead_time, trend_window, season):
+   """
+   forecast_demand
+   Forecast the node pool's demand (in nodes) lead_time minutes ahead from its demand history, as the
+   greater of:
+     - trend: a linear fit over the last trend_window minutes, exponentially weighted towards the most
+       recent samples, extrapolated lead_time minutes ahead while demand is rising
+     - seasonal: the current demand, plus the change in demand over the same lead_time one season earlier
+       (only once a full season of history has been recorded)
+   """
+   # imported on first use, as forecasting is optional..
+   import numpy
+
+   minutes = numpy.frombuffer(demand_history['minutes'].tobytes(), dtype=numpy.int32).astype(numpy.float64) - now_minute
+   demand = numpy.frombuffer(demand_history['demand'].tobytes(), dtype=numpy.float32).astype(numpy.float64)
+   if len(demand) == 0:
+      return 0.0
+
+   forecast = demand[-1]
+   recent = minutes > -trend_window
+   # extrapolate only a sustained rise, not the level shift following a step change in demand..
+   if numpy.count_nonzero(recent) >= 3 and numpy.all(numpy.diff(demand[-3:]) > 0):
+      weights = numpy.exp(minutes[recent] / (trend_window / 2.0))
+      slope, intercept = numpy.polyfit(minutes[recent], demand[recent], 1, w=numpy.sqrt(weights))
+      forecast = max(forecast, intercept + slope * lead_time)
+   if minutes[0] <= -season:
+      season_then, season_ahead = numpy.interp([-season, lead_time - season], minutes, demand)
+      forecast = max(forecast, demand[-1] + season_ahead - season_then)
+
+   return max(float(forecast), 0.0)
+
+def update_node_pool(ce_client, node_pool_id, availability_domain, subnet_id, node_pool_new_size, wait=False):
    """
    update_node_pool
    Add or remove nodes from the node pool.
+   Returns the id of the work request tracking the update, once submitted or, where wait is set,
+   once the work request has completed.
    """
    placement_config_details = oci.container_engine.models.NodePoolPlacementConfigDetails(availability_domain=availability_domain, subnet_id=subnet_id)
    config_details = oci.container_engine.models.UpdateNodePoolNodeConfigDetails(size=node_pool_new_size, placement_configs=[placement_config_details])
    update_node_pool_details = oci.container_engine.models.UpdateNodePoolDetails(node_config_details=config_details)
 
+   if not wait:
+      response = ce_client.update_node_pool(node_pool_id, update_node_pool_details)
+      work_request_id = response.headers['opc-work-request-id']
+      logging.info("Update node pool submitted: " + work_request_id)
+      return work_request_id
+
    ce_composite_ops = oci.container_engine.ContainerEngineClientCompositeOperations(ce_client)
    response = ce_composite_ops.update_node_pool_and_wait_for_state(node_pool_id,
                                                                    update_node_pool_details,
@@ -69,10 +911,115 @@ def update_node_pool(ce_client, node_pool_id, availability_domain, subnet_id, no
                                                                                     oci.container_engine.models.WorkRequest.STATUS_FAILED],
                                                                   )
    if response.data.status == oci.container_engine.models.WorkRequest.STATUS_FAILED:
-      get_work_request_errors(ce_client, compartment_id, response.data.id)
+      get_work_request_errors(ce_client, response.data.compartment_id, response.data.id)
    else:
       logging.info("Update node pool succeeded..")
 
+   return response.data.id
+
+def delete_node(ce_client, node_pool_id, node_id, wait=False):
+   """
+   delete_node
+   Remove the specified node from the node pool, decrementing the node pool size. The node is drained
+   before it is removed, so it is deleted without being cordoned & drained again.
+   Returns the id of the work request tracking the deletion, once submitted or, where wait is set,
+   once the work request has completed.
+   """
+   delete_node_kwargs = {'is_decrement_size': True, 'override_eviction_grace_duration': "PT0M"}
+
+   if not wait:
+      response = ce_client.delete_node(node_pool_id, node_id, **delete_node_kwargs)
+      work_request_id = response.headers['opc-work-request-id']
+      logging.info("Delete node submitted: " + work_request_id)
+      return work_request_id
+
+   ce_composite_ops = oci.container_engine.ContainerEngineClientCompositeOperations(ce_client)
+   response = ce_composite_ops.delete_node_and_wait_for_state(node_pool_id,
+                                                              node_id,
+                                                              wait_for_states=[oci.container_engine.models.WorkRequest.STATUS_SUCCEEDED,
+                                                                               oci.container_engine.models.WorkRequest.STATUS_FAILED],
+                                                              operation_kwargs=delete_node_kwargs
+                                                             )
+   if response.data.status == oci.container_engine.models.WorkRequest.STATUS_FAILED:
+      get_work_request_errors(ce_client, response.data.compartment_id, response.data.id)
+   else:
+      logging.info("Delete node succeeded..")
+
+   return response.data.id
+
+def get_work_request_status(ce_client, work_request_id):
+   """
+   get_work_request_status
+   Get the status of the specified container engine work request.
+   """
+   response = ce_client.get_work_request(work_request_id)
+
+   return response.data.status
+
+def get_work_request_errors(ce_client, compartment_id, work_request_id):
+   """
+   get_work_request_errors
+   Log the errors reported by the specified container engine work request.
+   """
+   response = ce_client.list_work_request_errors(compartment_id, work_request_id)
+   for work_request_error in response.data:
+      logging.info("Work Request Error: " + str(work_request_error.code) + ": " + str(work_request_error.message))
+
+   return response.data
+
+def get_state_store(signer, state_store_uri):
+   """
+   get_state_store
+   Configure the store used to persist state between invocations, e.g. in-flight work requests:
+     - file:<directory>, a local directory (retained only for the life of the function container)
+     - objectstorage:<namespace>/<bucket>, an object storage bucket
+   """
+   backend, location = state_store_uri.split(":", 1)
+   if backend == "objectstorage":
+      namespace, bucket = location.split("/", 1)
+      object_storage_client = get_client(signer, oci.object_storage.ObjectStorageClient)
+      return {'backend': backend, 'client': object_storage_client, 'namespace': namespace, 'bucket': bucket}
+   if backend == "file":
+      return {'backend': backend, 'directory': location}
+
+   raise ValueError("Unsupported state store: " + state_store_uri)
+
+def load_state(state_store, key):
+   """
+   load_state
+   Load the state saved under key, or an empty dict where no state has been saved.
+   """
+   if state_store['backend'] == "objectstorage":
+      try:
+         response = state_store['client'].get_object(state_store['namespace'], state_store['bucket'], key + ".json")
+      except oci.exceptions.ServiceError as e:
+         if e.status == 404:
+            return {}
+         raise
+      return json.loads(response.data.content.decode('utf-8'))
+
+   path = os.path.join(state_store['directory'], key + ".json")
+   if not os.path.exists(path):
+      return {}
+   with open(path) as f:
+      return json.load(f)
+
+def save_state(state_store, key, state):
+   """
+   save_state
+   Save the state under key, replacing any previously saved state.
+   """
+   if state_store['backend'] == "objectstorage":
+      state_store['client'].put_object(state_store['namespace'], state_store['bucket'], key + ".json", json.dumps(state).encode('utf-8'))
+      return
+
+   # write to a temporary file & rename, so that a concurrent reader never sees a partial file..
+   os.makedirs(state_store['directory'], exist_ok=True)
+   path = os.path.join(state_store['directory'], key + ".json")
+   with open(path + ".tmp", 'w') as f:
+      json.dump(state, f)
+   os.replace(path + ".tmp", path)
+
    return
 
 def evaluate_node(compute_client, instance_id):
@@ -93,105 +1040,403 @@ def get_secret_bundle(secrets_client, secret_id):
 
    return response
 
+def get_secret(secrets_client, secret_id):
+   """
+   get_secret
+   Gets the decoded content of the specified secret, i.e. the kubernetes service account token.
+   """
+   secret_bundle = get_secret_bundle(secrets_client, secret_id)
+   secret_details = json.loads(str(secret_bundle.data))
+   secret_base64 = (secret_details['secret_bundle_content']['content'])
+   secret_byte = base64.b64decode(secret_base64)
+   secret = secret_byte.decode('utf-8')
+
+   return secret
+
 def get_kubeconfig(ce_client, cluster_id):
     """
     get_kubeconfig
     Retrieve the kubconfig file for a specified cluster id.
     """
     response = ce_client.create_kubeconfig(cluster_id)
-    with open('/tmp/kubeconfig', 'w') as f:
-        f.write(response.data.text)
 
     if response.data.text:
         logging.info("kubeconfig retrieved")
     else:
         logging.info("Error retrieving the kubeconfig")
 
-    return
+    return response.data.text
+
+def get_kube_api(kubeconfig, secret):
+   """
+   get_kube_api
+   Build the kubernetes api server connection details from the kubeconfig and the service account token.
+   """
+   server = re.search(r'^\s*server:\s*["\']?([^"\'\s]+)', kubeconfig, re.MULTILINE).group(1)
+   ca_data = re.search(r'^\s*certificate-authority-data:\s*["\']?([^"\'\s]+)', kubeconfig, re.MULTILINE)
+   ssl_context = None
+   if server.startswith("https"):
+      if ca_data:
+         ssl_context = ssl.create_default_context(cadata=base64.b64decode(ca_data.group(1)).decode('utf-8'))
+      else:
+         ssl_context = ssl.create_default_context()
+
+   return {'server': server.rstrip('/'), 'token': secret, 'ssl_context': ssl_context}
 
-def get_unsched_pods(node_pool_name, secret):
+def kube_request(kube_api, method, path, query=None, body=None, content_type="application/json", bounded=True):
+   """
+   kube_request
+   Send a request to the kubernetes api server, and return the decoded JSON response.
+   Where bounded, the request is not sent after the invocation deadline, and its timeout is cut to the time remaining.
+   """
+   timeout = call_timeout(30, method + " " + path) if bounded else 30
+   url = kube_api['server'] + path
+   if query:
+      url += "?" + urllib.parse.urlencode(query)
+   data = json.dumps(body).encode('utf-8') if body is not None else None
+   request = urllib.request.Request(url, data=data, method=method,
+                                    headers={'Authorization': 'Bearer ' + kube_api['token'],
+                                             'Accept': 'application/json',
+                                             'Content-Type': content_type}
+                                   )
+   count_api_call("kubernetes")
+   try:
+      with urllib.request.urlopen(request, context=kube_api['ssl_context'], timeout=timeout) as response:
+         return json.loads(response.read().decode('utf-8'))
+   except urllib.error.HTTPError:
+      raise
+   except OSError as e:
+      # request timed out, cut short by the invocation deadline..
+      if bounded and time_remaining() is not None and time_remaining() <= 0:
+         raise DeadlineExceeded("Invocation deadline exceeded during " + method + " " + path) from e
+      raise
+
+def kube_watch(kube_api, path, query, timeout_seconds):
+   """
+   kube_watch
+   Open a watch on the kubernetes api server, and yield each decoded watch event as it is received.
+   The api server ends the watch after timeout_seconds.
+   """
+   query = dict(query, watch="true", allowWatchBookmarks="true", timeoutSeconds=timeout_seconds)
+   url = kube_api['server'] + path + "?" + urllib.parse.urlencode(query)
+   request = urllib.request.Request(url, headers={'Authorization': 'Bearer ' + kube_api['token'], 'Accept': 'application/json'})
+   count_api_call("kubernetes")
+   with urllib.request.urlopen(request, context=kube_api['ssl_context'], timeout=timeout_seconds + 30) as response:
+      for line in response:
+         if line.strip():
+            yield json.loads(line.decode('utf-8'))
+
+def is_unsched_pod(pod):
+   """
+   is_unsched_pod
+   Determine if a pod is Pending, with the Unschedulable condition.
+   """
+   status = pod.get('status') or {}
+   conditions = status.get('conditions') or []
+
+   return status.get('phase') == "Pending" and any(condition.get('reason') == "Unschedulable" for condition in conditions)
+
+def list_pending_pods(kube_api, page_size=500):
+   """
+   list_pending_pods
+   Retrieve the Pending pods in the cluster, yielding one page (pod list) at a time.
+   """
+   return list_pods(kube_api, 'status.phase=Pending', page_size)
+
+def list_pods(kube_api, field_selector, page_size=500):
+   """
+   list_pods
+   Retrieve the pods in the cluster selected by the field selector, yielding one page (pod list) at
+   a time and following the continue token to the next page.
+   """
+   query = {'fieldSelector': field_selector, 'limit': page_size}
+   while True:
+      pod_list = kube_request(kube_api, "GET", "/api/v1/pods", query)
+      yield pod_list
+
+      continue_token = pod_list.get('metadata', {}).get('continue')
+      if not continue_token:
+         break
+      query['continue'] = continue_token
+
+def get_unsched_pods(kube_api, node_pool_name=None, page_size=500):
    """
    get_unsched_pods
-   Retrieve JSON data summarising unschedulable pods.
-   """
-   # congfigure kubectl for use with oke-autoscale service account:
-   #   - add oke-autoscale service account as user definition..
-   response = Popen(['kubectl config set-credentials oke-autoscaler --token=' + secret],
-                    shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-                   )
-   output, errors = response.communicate()
-   logging.info("Popen Output, kubectl config: " + output)
-   logging.info("Popen Errors, kubectl config: " + errors)
-
-   #   - set context..
-   response = Popen(['kubectl config set-context --current --user=oke-autoscaler'],
-                    shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-                   )
-   output, errors = response.communicate()
-   logging.info("Popen Output, kubectl config: " + output)
-   logging.info("Popen Errors, kubectl config: " + errors)
-
-   # get pods..
-   response = Popen(['kubectl get pods --all-namespaces -o json | jq \'.items[] | select(.status.conditions[0].reason == "Unschedulable")\' | jq \' select(.spec.nodeSelector.name == "' + node_pool_name + '")\' | jq -s .'],
-                    shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-                   )
-
-   output, errors = response.communicate()
-   logging.info("Popen Output, kubectl get pods: " + output)
-   logging.info("Popen Errors, kubectl get pods: " + errors)
-
-   return output
-
-def drain_node(lifo_node_name, secret):
+   Retrieve the unschedulable pods for the specified node pool, or for all node pools where no
+   node pool name is specified.
+   Only Pending pods are requested from the api server, one page at a time, and each page is
+   filtered on the Unschedulable condition and nodeSelector name before the next is requested.
    """
-   drain_node
-   Cordon and drain the specified worker node.
+   unsched_pods = []
+   for pod_list in list_pending_pods(kube_api, page_size):
+      for pod in pod_list.get('items') or []:
+         node_selector = pod.get('spec', {}).get('nodeSelector') or {}
+         if is_unsched_pod(pod):
+            if node_pool_name is None or node_selector.get('name') == node_pool_name:
+               unsched_pods.append(pod)
+
+   logging.info("Unschedulable Pods: " + str(len(unsched_pods)))
+
+   return unsched_pods
+
+def cordon_node(kube_api, node_name, unschedulable=True):
+   """
+   cordon_node
+   Mark the specified worker node as unschedulable or, where unschedulable is False, schedulable.
+   A node is returned to service regardless of the invocation deadline.
    """
-   # drain worker node..
-   response = Popen(['kubectl drain ' + lifo_node_name + ' --delete-local-data --ignore-daemonsets --force --grace-period=10 --timeout=90s'],
-                    shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-                   )
-   output, errors = response.communicate()
-   logging.info("Popen Output, kubectl drain: " + output)
-   logging.info("Popen Errors, kubectl drain: " + errors)
+   kube_request(kube_api, "PATCH", "/api/v1/nodes/" + node_name, body={'spec': {'unschedulable': unschedulable}},
+                content_type="application/strategic-merge-patch+json", bounded=unschedulable)
 
    return
 
+def is_evictable_pod(pod):
+   """
+   is_evictable_pod
+   Determine if a pod should be evicted in order to drain its node, i.e. excluding DaemonSet pods,
+   mirror (static) pods and pods which have already terminated.
+   """
+   owner_kinds = [owner.get('kind') for owner in pod['metadata'].get('ownerReferences') or []]
+   if "DaemonSet" in owner_kinds:
+      return False
+   if 'kubernetes.io/config.mirror' in (pod['metadata'].get('annotations') or {}):
+      return False
+   if pod.get('status', {}).get('phase') in ["Succeeded", "Failed"]:
+      return False
+
+   return True
+
+def get_evictable_pods(kube_api, node_name):
+   """
+   get_evictable_pods
+   Retrieve the pods running on the specified worker node which should be evicted in order to drain it.
+   """
+   pod_list = kube_request(kube_api, "GET", "/api/v1/pods", {'fieldSelector': 'spec.nodeName=' + node_name})
+
+   return [pod for pod in pod_list.get('items') or [] if is_evictable_pod(pod)]
+
+def get_nodes_evictable_pods(kube_api, node_names, concurrency, shared, cluster_id):
+   """
+   get_nodes_evictable_pods
+   Retrieve the evictable pods of each of the specified worker nodes, keyed by node name. Only the pods of
+   these nodes are listed, concurrently, and shared by the node pools evaluated in the same invocation.
+   """
+   def node_evictable_pods(node_name):
+      return get_shared(shared, 'evictable_pods:' + cluster_id + ':' + node_name, lambda: get_evictable_pods(kube_api, node_name))
+
+   with ThreadPoolExecutor(max_workers=concurrency) as executor:
+      return dict(zip(node_names, executor.map(node_evictable_pods, node_names)))
+
+def get_pod_disruption_budgets(kube_api):
+   """
+   get_pod_disruption_budgets
+   Retrieve the PodDisruptionBudgets across the cluster.
+   """
+   pdb_list = kube_request(kube_api, "GET", "/apis/policy/v1/poddisruptionbudgets")
+
+   return pdb_list.get('items') or []
+
+def match_label_selector(selector, labels):
+   """
+   match_label_selector
+   Determine if a set of labels is matched by a kubernetes label selector (matchLabels & matchExpressions).
+   An empty selector matches all labels, a missing selector none.
+   """
+   if selector is None:
+      return False
+   for (key, value) in (selector.get('matchLabels') or {}).items():
+      if labels.get(key) != value:
+         return False
+   for expression in selector.get('matchExpressions') or []:
+      key, operator, values = expression['key'], expression['operator'], expression.get('values') or []
+      if operator == "In" and labels.get(key) not in values:
+         return False
+      if operator == "NotIn" and key in labels and labels[key] in values:
+         return False
+      if operator == "Exists" and key not in labels:
+         return False
+      if operator == "DoesNotExist" and key in labels:
+         return False
+
+   return True
+
+def rank_scale_down_candidates(nodes_data, scheduled_pods, pdbs):
+   """
+   rank_scale_down_candidates
+   Rank the nodes in the node pool by the cost of removing them, cheapest first. Nodes are ordered by:
+     - blocking-pdbs: PodDisruptionBudgets which would refuse the eviction of the node's pods
+     - local-storage-pods: pods with emptyDir or hostPath volumes, whose data is lost on eviction
+     - evictable-pods: pods which would be evicted (i.e. excluding DaemonSet & mirror pods)
+     - load: the node's cpu or ram load, whichever is greater
+   Returns a list of the candidates: name, id & the cost attributes.
+   """
+   candidates = []
+   for node in nodes_data.values():
+      pods = [pod for pod in scheduled_pods.get(node['name'], []) if is_evictable_pod(pod)]
+      local_storage_pods = [pod for pod in pods if any('emptyDir' in volume or 'hostPath' in volume for volume in pod.get('spec', {}).get('volumes') or [])]
+      blocking_pdbs = []
+      for pdb in pdbs:
+         pdb_pods = [pod for pod in pods if pod['metadata'].get('namespace') == pdb['metadata'].get('namespace')
+                     and match_label_selector(pdb.get('spec', {}).get('selector'), pod['metadata'].get('labels') or {})]
+         if len(pdb_pods) > (pdb.get('status') or {}).get('disruptionsAllowed', 0):
+            blocking_pdbs.append(pdb['metadata'].get('namespace') + "/" + pdb['metadata'].get('name'))
+      candidates.append({'name': node['name'], 'id': node['id'], 'blocking-pdbs': blocking_pdbs, 'local-storage-pods': len(local_storage_pods),
+                         'evictable-pods': len(pods), 'load': max(node['cpu_load'], node['ram_load'])})
+   candidates.sort(key=lambda candidate: (len(candidate['blocking-pdbs']), candidate['local-storage-pods'], candidate['evictable-pods'], candidate['load']))
+   log_json("Scale-Down Candidates: ", candidates)
+
+   return candidates
+
+def evict_pod(kube_api, pod, grace_period, deadline):
+   """
+   evict_pod
+   Evict a pod through the Eviction api, retrying with backoff while the eviction is refused by a
+   PodDisruptionBudget, then wait for the pod to be deleted.
+   Returns the outcome: evicted, blocked (by a PodDisruptionBudget), timed-out (evicted but not deleted
+   before the deadline) or failed. The deadline bounds the eviction, rather than the invocation deadline.
+   """
+   namespace = pod['metadata']['namespace']
+   name = pod['metadata']['name']
+   pod_path = "/api/v1/namespaces/" + namespace + "/pods/" + name
+   eviction = {'apiVersion': 'policy/v1', 'kind': 'Eviction',
+               'metadata': {'name': name, 'namespace': namespace},
+               'deleteOptions': {'gracePeriodSeconds': grace_period}}
+
+   # evict pod, backing off while a disruption budget blocks the eviction..
+   backoff = 1
+   while True:
+      try:
+         kube_request(kube_api, "POST", pod_path + "/eviction", body=eviction, bounded=False)
+         break
+      except urllib.error.HTTPError as e:
+         if e.code == 404:
+            return "evicted"
+         if e.code != 429:
+            logging.info("Eviction failed: " + namespace + "/" + name + ": " + str(e))
+            return "failed"
+         if time.monotonic() + backoff > deadline:
+            return "blocked"
+         time.sleep(backoff)
+         backoff = min(backoff * 2, 10)
+      except OSError as e:
+         logging.info("Eviction failed: " + namespace + "/" + name + ": " + str(e))
+         return "failed"
+
+   # wait for pod deletion, i.e. pod not found or replaced by a new pod of the same name..
+   while time.monotonic() < deadline:
+      try:
+         current_pod = kube_request(kube_api, "GET", pod_path, bounded=False)
+      except urllib.error.HTTPError as e:
+         if e.code == 404:
+            return "evicted"
+         logging.info("Eviction wait failed: " + namespace + "/" + name + ": " + str(e))
+         return "failed"
+      except OSError as e:
+         logging.info("Eviction wait failed: " + namespace + "/" + name + ": " + str(e))
+         return "failed"
+      if current_pod['metadata'].get('uid') != pod['metadata'].get('uid'):
+         return "evicted"
+      time.sleep(2)
+
+   return "timed-out"
+
+def drain_node(kube_api, node_name, grace_period, timeout, concurrency):
+   """
+   drain_node
+   Cordon and drain the specified worker node, evicting its pods concurrently.
+   Returns the drain outcome: the pods evicted, blocked, timed-out & failed, and the drain status -
+   drained where all pods were evicted, otherwise failed. Unless drained, the node is uncordoned,
+   including where the cordon or pod listing raise.
+   """
+   deadline = time.monotonic() + timeout
+   if invocation['deadline'] is not None:
+      # finish before the invocation deadline, leaving time to delete or uncordon the node..
+      invocation_timeout = invocation['timeout'] if invocation['timeout'] is not None else float(os.environ.get('function_timeout', 120))
+      deadline = min(deadline, invocation['deadline'] - drain_deadline_reserve * invocation_timeout)
+   drain_outcome = {'node': node_name, 'evicted': [], 'blocked': [], 'timed-out': [], 'failed': [], 'status': "failed"}
+   try:
+      #   - cordon node..
+      cordon_node(kube_api, node_name)
+
+      #   - evict pods..
+      pods = get_evictable_pods(kube_api, node_name)
+      if pods:
+         with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pod_outcomes = executor.map(lambda pod: evict_pod(kube_api, pod, grace_period, deadline), pods)
+            for pod, pod_outcome in zip(pods, pod_outcomes):
+               drain_outcome[pod_outcome].append(pod['metadata']['namespace'] + "/" + pod['metadata']['name'])
+      if len(drain_outcome['evicted']) == len(pods):
+         drain_outcome['status'] = "drained"
+   finally:
+      if drain_outcome['status'] != "drained":
+         #   - return node to service..
+         cordon_node(kube_api, node_name, unschedulable=False)
+   logging.info("Drain: " + json.dumps(drain_outcome))
+
+   return drain_outcome
+
 # oke-autoscaler logic..
-def do(signer):
+def evaluate_node_pool(signer, config, shared):
+   """
+   evaluate_node_pool
+   Evaluate a single node pool for scale-up or scale-down, and return the result data.
+   config provides the node pool's configuration variables, shared the state shared by all node pools
+   evaluated in the same invocation.
+   """
    # configure environment:
    #   - external / user-defined variables..
    fn_var = 0
-   if 'node_pool_eval_window' in os.environ:
-      node_pool_eval_window = str(os.environ['node_pool_eval_window'])
+   if 'node_pool_eval_window' in config:
+      node_pool_eval_window = str(config['node_pool_eval_window'])
    else: fn_var = 1
-   if 'cluster_id' in os.environ:
-      cluster_id = os.environ['cluster_id']
+   if 'cluster_id' in config:
+      cluster_id = config['cluster_id']
    else: fn_var = 1
-   if 'node_pool_id' in os.environ:
-      node_pool_id = os.environ['node_pool_id']
+   if 'node_pool_id' in config:
+      node_pool_id = config['node_pool_id']
    else: fn_var = 1
-   if 'secret_id' in os.environ:
-      secret_id = os.environ['secret_id']
+   if 'secret_id' in config:
+      secret_id = config['secret_id']
    else: fn_var = 1
-   if 'node_pool_min_size' in os.environ:
-      node_pool_min_size = int(os.environ['node_pool_min_size'])
+   if 'node_pool_min_size' in config:
+      node_pool_min_size = int(config['node_pool_min_size'])
    else: fn_var = 1
-   if 'node_pool_max_size' in os.environ:
-      node_pool_max_size = int(os.environ['node_pool_max_size'])
+   if 'node_pool_max_size' in config:
+      node_pool_max_size = int(config['node_pool_max_size'])
    else: fn_var = 1
-   if 'node_pool_eval_cpu_load' in os.environ:
-      node_pool_eval_cpu_load = int(os.environ['node_pool_eval_cpu_load'])
+   if 'node_pool_eval_cpu_load' in config:
+      node_pool_eval_cpu_load = int(config['node_pool_eval_cpu_load'])
    else: fn_var = 1
-   if 'node_pool_eval_ram_load' in os.environ:
-      node_pool_eval_ram_load = int(os.environ['node_pool_eval_ram_load'])
+   if 'node_pool_eval_ram_load' in config:
+      node_pool_eval_ram_load = int(config['node_pool_eval_ram_load'])
    else: fn_var = 1
 
+   #   - optional variables..
+   node_pool_metrics_batch_size = int(config.get('node_pool_metrics_batch_size', 50))
+   node_pool_inspect_concurrency = int(config.get('node_pool_inspect_concurrency', 8))
+   node_pool_scale_up_sizing = str(config.get('node_pool_scale_up_sizing', "bin-pack"))
+   node_shape_allocatable_ratio = float(config.get('node_shape_allocatable_ratio', 0.9))
+   node_max_pods = int(config.get('node_max_pods', 110))
+   node_pool_update_mode = str(config.get('node_pool_update_mode', "async"))
+   node_drain_grace_period = int(config.get('node_drain_grace_period', 10))
+   node_drain_timeout = int(config.get('node_drain_timeout', 90))
+   node_drain_concurrency = int(config.get('node_drain_concurrency', 8))
+   state_store_uri = str(config.get('state_store', "file:/tmp/oke-autoscaler-state"))
+   node_pool_metrics_history_window = int(config.get('node_pool_metrics_history_window', 0))
+   node_pool_scale_down_window = int(config.get('node_pool_scale_down_window', config.get('node_pool_eval_window', 0)))
+   node_pool_scale_down_statistic = str(config.get('node_pool_scale_down_statistic', "mean"))
+   node_pool_scale_down_selection = str(config.get('node_pool_scale_down_selection', "cost"))
+   node_pool_scale_down_max_step = int(config.get('node_pool_scale_down_max_step', 1))
+   node_pool_forecast = str(config.get('node_pool_forecast', "disabled"))
+   node_pool_forecast_target_load = float(config.get('node_pool_forecast_target_load', 70))
+   node_pool_forecast_trend_window = int(config.get('node_pool_forecast_trend_window', 30))
+   node_pool_forecast_season = int(config.get('node_pool_forecast_season', 1440))
+
    #   - internal variables..
-   time_now = pendulum.now("UTC")
-   time_now_iso8601 = time_now.to_iso8601_string()
-   time_then = time_now.subtract(minutes=int(node_pool_eval_window))
-   time_then_iso8601 = time_then.to_iso8601_string()
+   time_now = utc_now()
+   time_now_iso8601 = time_now.isoformat()
+   time_then = time_now - datetime.timedelta(minutes=int(node_pool_eval_window))
+   time_then_iso8601 = time_then.isoformat()
    logging.info("Time Now: " + time_now_iso8601)
    logging.info("Time Then: " + time_then_iso8601)
 
@@ -206,6 +1451,7 @@ def do(signer):
    node_pool_expanding = 0
    node_pool_contract = 0
    node_pool_result_reason = None
+   node_pool_forecast_size = None
 
    sum_cpu_load = 0
    sum_ram_load = 0
@@ -216,30 +1462,52 @@ def do(signer):
    # proceed if all external / user-defined variables defined..
    if fn_var == 0:
       # define api clients..
-      ce_client = oci.container_engine.ContainerEngineClient({}, signer=signer)
-      monitoring_client = oci.monitoring.MonitoringClient({}, signer=signer)
-      compute_client = oci.core.ComputeClient({}, signer=signer)
-      secrets_client = oci.secrets.SecretsClient({}, signer=signer)
+      ce_client = get_client(signer, oci.container_engine.ContainerEngineClient)
+      monitoring_client = get_client(signer, oci.monitoring.MonitoringClient)
+      compute_client = get_client(signer, oci.core.ComputeClient)
+      secrets_client = get_client(signer, oci.secrets.SecretsClient)
+      state_store = get_state_store(signer, state_store_uri)
 
       # obtain node pool detail from ce_client..
-      get_node_pool = get_node_pool_details(ce_client, node_pool_id)
+      with timed_phase("node-pool"):
+         get_node_pool = get_node_pool_details(ce_client, node_pool_id)
       node_pool_details = json.loads(str(get_node_pool.data))
       node_pool_name = (node_pool_details['initial_node_labels'][0]['value'])
-      logging.info ("Node Pool Details: " + json.dumps(node_pool_details, indent=4))
+      log_json("Node Pool Details: ", node_pool_details)
 
       compartment_id = (node_pool_details['compartment_id'])
       node_pool_init_size = (node_pool_details['node_config_details']['size'])
       availability_domain = (node_pool_details['node_config_details']['placement_configs'][0]['availability_domain'])
       subnet_id = (node_pool_details['node_config_details']['placement_configs'][0]['subnet_id'])
 
-      # set node_pool_status..
-      logging.info("Node Lifecycle State: ")
-      if get_node_pool.data.nodes != None:
-         nodes = json.loads(str(get_node_pool.data.nodes))
-         for i in range(len(nodes)):
-            logging.info(nodes[i]['lifecycle_state'])
-            if (nodes[i]['lifecycle_state']) not in ["ACTIVE", "DELETED"]:
-               node_pool_status = "updating"
+      # set node_pool_status:
+      #   - from the work requests of the update or node deletions submitted by a previous invocation..
+      node_pool_state = load_state(state_store, node_pool_id)
+      if node_pool_state.get('work_request_id'):
+         node_pool_state['work_request_ids'] = [node_pool_state.pop('work_request_id')]
+      if node_pool_state.get('work_request_ids'):
+         work_request_ids = node_pool_state['work_request_ids']
+         with timed_phase("work-request"):
+            work_request_statuses = [get_work_request_status(ce_client, work_request_id) for work_request_id in work_request_ids]
+         for (work_request_id, work_request_status) in zip(work_request_ids, work_request_statuses):
+            logging.info("Work Request Status: " + work_request_id + ": " + work_request_status)
+         if any(work_request_status in ["ACCEPTED", "IN_PROGRESS", "CANCELING"] for work_request_status in work_request_statuses):
+            node_pool_status = "updating"
+         else:
+            for (work_request_id, work_request_status) in zip(work_request_ids, work_request_statuses):
+               if work_request_status == "FAILED":
+                  get_work_request_errors(ce_client, compartment_id, work_request_id)
+            node_pool_state.pop('work_request_ids')
+            save_state(state_store, node_pool_id, node_pool_state)
+      #   - otherwise, from the lifecycle state of each node..
+      else:
+         logging.debug("Node Lifecycle State: ")
+         if get_node_pool.data.nodes != None:
+            nodes = json.loads(str(get_node_pool.data.nodes))
+            for i in range(len(nodes)):
+               logging.debug(nodes[i]['lifecycle_state'])
+               if (nodes[i]['lifecycle_state']) not in ["ACTIVE", "DELETED"]:
+                  node_pool_status = "updating"
 
       # discover and inspect each node in node pool:
       #   - for each node, populate nodes_data dict with node attributes:
@@ -249,74 +1517,88 @@ def do(signer):
          if node_pool_status != "updating":
             if get_node_pool.data.nodes != None:
                nodes = json.loads(str(get_node_pool.data.nodes))
-               for i in range(len(nodes)):
-                  if (nodes[i]['lifecycle_state']) != "DELETED":
-                     # get node details from ce and compute clients..
-                     logging.info('Node Data: ' + json.dumps(nodes[i], indent = 4))
-                     node_id = (nodes[i]['id'])
-                     node_name = (nodes[i]['private_ip'])
-                     instance_response = evaluate_node(compute_client, node_id)
-                     instance = json.loads(str(instance_response.data))
-                     time_created = (instance['time_created'])
-
-                     # get node cpu utilisation data from monitoring service..
-                     namespace = "oci_computeagent"
-                     query = "CpuUtilization[" + monitoring_resolution + "]{resourceId=" + node_id + "}.mean()"
-                     monitoring_response = summarize_metrics_data(monitoring_client, compartment_id, namespace, query, query_start_time, query_end_time, query_resolution)
-                     # get the oci monitoring aggregated datapoint..
-                     monitoring = json.loads(str(monitoring_response.data))
-                     node_cpu_load = (monitoring[0]['aggregated_datapoints'])
-                     node_cpu_load_val = (node_cpu_load[0]['value'])
-                     # get node ram utilisation data from monitoring service..
-                     namespace = "oci_computeagent"
-                     query = "MemoryUtilization[" + monitoring_resolution + "]{resourceId=" + node_id + "}.mean()"
-                     monitoring_response = summarize_metrics_data(monitoring_client, compartment_id, namespace, query, query_start_time, query_end_time, query_resolution)
-                     # get the oci monitoring aggregated datapoint..
-                     monitoring = json.loads(str(monitoring_response.data))
-                     node_ram_load = (monitoring[0]['aggregated_datapoints'])
-                     node_ram_load_val = (node_ram_load[0]['value'])
-
-                     # insert node data into nodes_data dict..
-                     nodes_data[i] = {'name': node_name, 'id': node_id, 'created': time_created, 'cpu_load':node_cpu_load_val , 'ram_load':node_ram_load_val}
-
-                     # determine last node added to node pool..
-                     lifo_node = max(nodes_data, key=lambda x: nodes_data[x].get('created'))
-                     lifo_node_name = nodes_data[lifo_node].get('name')
-
-                     # set node_pool_stability..
-                     lifo_node_created_str = nodes_data[lifo_node].get('created')
-                     lifo_node_created = pendulum.parse(lifo_node_created_str)
-                     lifo_node_stable = lifo_node_created.add(minutes=(6+node_pool_stabilization_window))
-                     if time_now > lifo_node_stable:
-                        node_pool_stability = "stable"
-                     else:
-                        node_pool_stability = "stabilizing"
-                     logging.info("Node Pool Stability: " + node_pool_stability)
+               #   - with node cpu & ram load from the node metrics history, where enabled..
+               metrics_history = None
+               if node_pool_metrics_history_window > 0:
+                  metrics_history = load_metrics_history(state_store, node_pool_id, node_pool_metrics_history_window)
+               with timed_phase("inspection"):
+                  nodes_data = inspect_nodes(compute_client, monitoring_client, compartment_id, nodes, monitoring_resolution, query_start_time, query_end_time, query_resolution, node_pool_metrics_batch_size, node_pool_inspect_concurrency,
+                                             metrics_history, time_now, min(node_pool_scale_down_window, node_pool_metrics_history_window), node_pool_scale_down_statistic)
+               if metrics_history is not None:
+                  save_metrics_history(state_store, node_pool_id, metrics_history)
+
+               if nodes_data:
+                  # determine last node added to node pool..
+                  lifo_node = max(nodes_data, key=lambda x: nodes_data[x].get('created'))
+                  lifo_node_name = nodes_data[lifo_node].get('name')
+
+                  # set node_pool_stability..
+                  lifo_node_created_str = nodes_data[lifo_node].get('created')
+                  lifo_node_created = parse_time(lifo_node_created_str)
+                  lifo_node_stable = lifo_node_created + datetime.timedelta(minutes=(6+node_pool_stabilization_window))
+                  if time_now > lifo_node_stable:
+                     node_pool_stability = "stable"
+                  else:
+                     node_pool_stability = "stabilizing"
+                  logging.info("Node Pool Stability: " + node_pool_stability)
 
       # scale-up node pool:
-      #   - get kubernetes service account token from oci secret in vault..
-      get_secret = get_secret_bundle(secrets_client, secret_id)
-      secret_details = json.loads(str(get_secret.data))
-      secret_base64 = (secret_details['secret_bundle_content']['content'])
-      secret_byte = base64.b64decode(secret_base64)
-      secret = secret_byte.decode('utf-8')
-      #   - get kubeconfig..
-      get_kubeconfig(ce_client, cluster_id)
-      #   - evaluate node pool for unschedulablepods condition..
-      unsched_pods_response = get_unsched_pods(node_pool_name, secret)
-      unsched_pods_json = json.loads(str(unsched_pods_response))
-      unsched_pods_val = len(unsched_pods_json)
+      unsched_pods = []
+      if node_pool_status != "updating":
+         #   - get kubernetes service account token & kubeconfig..
+         kube_api = get_cluster_kube_api(ce_client, secrets_client, cluster_id, secret_id)
+         #   - evaluate node pool for unschedulablepods condition, listing pods once per cluster..
+         with timed_phase("pods"):
+            cluster_unsched_pods = get_shared(shared, 'unsched_pods:' + cluster_id, lambda: get_unsched_pods(kube_api))
+         unsched_pods = [pod for pod in cluster_unsched_pods if (pod['spec'].get('nodeSelector') or {}).get('name') == node_pool_name]
+      unsched_pods_val = len(unsched_pods)
+
+      # forecast node pool demand, where enabled:
+      #   - demand (in nodes) is the aggregate node cpu or ram load at the target load, plus the nodes
+      #     required to schedule any unschedulable pods..
+      #   - forecast over the node provisioning lead time..
+      if node_pool_forecast == "enabled" and nodes_data:
+         with timed_phase("forecast"):
+            node_pool_demand = max(sum(node['cpu_load'] for node in nodes_data.values()), sum(node['ram_load'] for node in nodes_data.values())) / node_pool_forecast_target_load
+            if unsched_pods_val > 0:
+               node_pool_demand += get_scale_up_size(compute_client, node_pool_details, unsched_pods, node_shape_allocatable_ratio, node_max_pods)
+            node_pool_lead_time = 6 + node_pool_stabilization_window
+            demand_history = load_demand_history(state_store, node_pool_id)
+            record_demand_sample(demand_history, epoch_minute(time_now), node_pool_demand, node_pool_forecast_season + node_pool_forecast_trend_window + node_pool_lead_time)
+            save_demand_history(state_store, node_pool_id, demand_history)
+            node_pool_forecast_demand = forecast_demand(demand_history, epoch_minute(time_now), node_pool_lead_time, node_pool_forecast_trend_window, node_pool_forecast_season)
+            node_pool_forecast_size = min(max(int(math.ceil(node_pool_forecast_demand)), node_pool_min_size), node_pool_max_size)
+         logging.info("Node Pool Demand: " + str(node_pool_demand) + ", Forecast Demand: " + str(node_pool_forecast_demand))
 
       #   - update node pool..
       if node_pool_status != "updating":
          if node_pool_stability == "stable":
             if unsched_pods_val > 0.0:
                if node_pool_init_size < node_pool_max_size:
-                  node_pool_new_size = node_pool_init_size + 1
+                  if node_pool_scale_up_sizing == "bin-pack":
+                     node_pool_new_size = min(node_pool_init_size + get_scale_up_size(compute_client, node_pool_details, unsched_pods, node_shape_allocatable_ratio, node_max_pods), node_pool_max_size)
+                  else:
+                     node_pool_new_size = node_pool_init_size + 1
+                  if node_pool_forecast_size is not None:
+                     node_pool_new_size = max(node_pool_new_size, node_pool_forecast_size)
                   node_pool_expanding = 1
                   logging.info("Scale-Up Node Pool..")
-                  update_node_pool(ce_client, node_pool_id, availability_domain, subnet_id, node_pool_new_size)
+                  with timed_phase("update"):
+                     work_request_id = update_node_pool(ce_client, node_pool_id, availability_domain, subnet_id, node_pool_new_size, node_pool_update_mode == "wait")
                   node_pool_result = "scale-up"
+                  if node_pool_update_mode != "wait":
+                     save_state(state_store, node_pool_id, dict(node_pool_state, work_request_ids=[work_request_id]))
+            #   - pre-scale node pool ahead of forecast demand..
+            elif node_pool_forecast_size is not None and node_pool_forecast_size > node_pool_init_size:
+               node_pool_new_size = node_pool_forecast_size
+               node_pool_expanding = 1
+               node_pool_prescale = 1
+               logging.info("Pre-Scale Node Pool: Forecast..")
+               with timed_phase("update"):
+                  work_request_id = update_node_pool(ce_client, node_pool_id, availability_domain, subnet_id, node_pool_new_size, node_pool_update_mode == "wait")
+               node_pool_result = "scale-up"
+               if node_pool_update_mode != "wait":
+                  save_state(state_store, node_pool_id, dict(node_pool_state, work_request_ids=[work_request_id]))
 
       # scale-down node pool..
       #   - establish aggregated resource % utilisation data points..
@@ -357,19 +1639,110 @@ def do(signer):
                            node_pool_contract_ram = 1
                            logging.info("Scale-Down Node Pool: RAM..")
 
-                  # if scale-down condition met, drain worker node & update node pool:
+                  # size the scale-down step: remove up to node_pool_scale_down_max_step nodes, while the projected
+                  # average load of the remaining nodes stays below the thresholds..
+                  node_pool_scale_down_step = 1
+                  if node_pool_contract == 1:
+                     while node_pool_scale_down_step < node_pool_scale_down_max_step:
+                        node_pool_remaining_size = node_pool_init_size - node_pool_scale_down_step - 1
+                        if node_pool_remaining_size < max(node_pool_min_size, 1):
+                           break
+                        if node_pool_eval_cpu_load != 0 and sum_cpu_load / node_pool_remaining_size >= node_pool_eval_cpu_load:
+                           break
+                        if node_pool_eval_ram_load != 0 and sum_ram_load / node_pool_remaining_size >= node_pool_eval_ram_load:
+                           break
+                        if node_pool_forecast_size is not None and node_pool_forecast_size > node_pool_remaining_size:
+                           break
+                        node_pool_scale_down_step += 1
+                     node_pool_new_size = node_pool_init_size - node_pool_scale_down_step
+                     logging.info("Scale-Down Step: " + str(node_pool_scale_down_step))
+
+                  # defer scale-down while forecast demand requires the node..
+                  if node_pool_contract == 1 and node_pool_forecast_size is not None and node_pool_forecast_size > node_pool_new_size:
+                     node_pool_contract = 0
+                     node_pool_contract_deferred = 1
+                     logging.info("Scale-Down Deferred: Forecast..")
+
+                  # if scale-down condition met, select, drain & delete worker nodes:
                   if node_pool_contract == 1:
-                     #   - cordon & drain node..
-                     drain_node(lifo_node_name, secret)
-                     #   - update node pool..
-                     logging.info("Scale-Down Node Pool")
-                     update_node_pool(ce_client, node_pool_id, availability_domain, subnet_id, node_pool_new_size)
-                     node_pool_result = "scale-down"
+                     #   - select the nodes cheapest to remove, or the last nodes added..
+                     with timed_phase("selection"):
+                        if node_pool_scale_down_selection == "lifo":
+                           scale_down_candidates = [{'name': node['name'], 'id': node['id'], 'blocking-pdbs': []}
+                                                    for node in sorted(nodes_data.values(), key=lambda node: node['created'], reverse=True)]
+                        else:
+                           evictable_pods = get_nodes_evictable_pods(kube_api, [node['name'] for node in nodes_data.values()], node_pool_inspect_concurrency, shared, cluster_id)
+                           pdbs = get_shared(shared, 'pdbs:' + cluster_id, lambda: get_pod_disruption_budgets(kube_api))
+                           scale_down_candidates = rank_scale_down_candidates(nodes_data, evictable_pods, pdbs)
+                     #   - not where the nodes' pods cannot be evicted..
+                     scale_down_nodes = [node for node in scale_down_candidates if not node['blocking-pdbs']][:node_pool_scale_down_step]
+                     if not scale_down_nodes:
+                        scale_down_node = scale_down_candidates[0]
+                        logging.info("Scale-Down Blocked: " + ", ".join(scale_down_node['blocking-pdbs']))
+                     else:
+                        logging.info("Scale-Down Nodes: " + ", ".join(node['name'] for node in scale_down_nodes))
+                        drain_outcomes = []
+                        deleted_nodes = []
+                        work_request_ids = []
+                        scale_down_errors = []
+                        try:
+                           #   - cordon all nodes before any are drained, so evicted pods are not rescheduled onto another node being drained..
+                           if len(scale_down_nodes) > 1:
+                              for node in scale_down_nodes:
+                                 cordon_node(kube_api, node['name'])
+                           #   - drain nodes concurrently, a node failing to drain is returned to service by drain_node..
+                           with timed_phase("drain"):
+                              with ThreadPoolExecutor(max_workers=len(scale_down_nodes)) as executor:
+                                 drain_futures = [executor.submit(drain_node, kube_api, node['name'], node_drain_grace_period, node_drain_timeout, node_drain_concurrency)
+                                                  for node in scale_down_nodes]
+                              for (node, future) in zip(scale_down_nodes, drain_futures):
+                                 try:
+                                    drain_outcomes.append(future.result())
+                                 except Exception as e:
+                                    logging.info("Drain failed: " + node['name'] + ": " + str(e))
+                                    scale_down_errors.append(e)
+                                    drain_outcomes.append({'node': node['name'], 'evicted': [], 'blocked': [], 'timed-out': [], 'failed': [], 'status': "error"})
+                           drained_nodes = [node for (node, outcome) in zip(scale_down_nodes, drain_outcomes) if outcome['status'] == "drained"]
+                           if not drained_nodes:
+                              drain_outcome = drain_outcomes[0]
+                           #   - delete nodes from node pool, once drained..
+                           if drained_nodes:
+                              logging.info("Scale-Down Node Pool")
+                              with timed_phase("update"):
+                                 with ThreadPoolExecutor(max_workers=len(drained_nodes)) as executor:
+                                    delete_futures = [executor.submit(delete_node, ce_client, node_pool_id, node['id'], node_pool_update_mode == "wait") for node in drained_nodes]
+                                 for (node, future) in zip(drained_nodes, delete_futures):
+                                    try:
+                                       work_request_ids.append(future.result())
+                                       deleted_nodes.append(node)
+                                    except Exception as e:
+                                       logging.info("Delete node failed: " + node['name'] + ": " + str(e))
+                                       scale_down_errors.append(e)
+                        finally:
+                           #   - record the deletions submitted..
+                           if work_request_ids and node_pool_update_mode != "wait":
+                              save_state(state_store, node_pool_id, dict(node_pool_state, work_request_ids=work_request_ids))
+                           #   - return to service the nodes not deleted, other than those drain_node has returned..
+                           returned_nodes = [outcome['node'] for outcome in drain_outcomes if outcome['status'] == "failed"]
+                           for node in scale_down_nodes:
+                              if node not in deleted_nodes and node['name'] not in returned_nodes:
+                                 try:
+                                    cordon_node(kube_api, node['name'], unschedulable=False)
+                                 except Exception as e:
+                                    logging.warning("Uncordon failed: " + node['name'] + ": " + str(e))
+                        if deleted_nodes:
+                           node_pool_new_size = node_pool_init_size - len(deleted_nodes)
+                           node_pool_result = "scale-down"
+                        elif scale_down_errors:
+                           # e.g. the invocation deadline, or an authentication error..
+                           raise scale_down_errors[0]
 
       #   - define scale operation direction & cause..
       if "node_pool_result" in locals():
          if node_pool_result == "scale-up":
             node_pool_result_reason = "unschedulable-pods"
+            if "node_pool_prescale" in locals():
+               node_pool_result_reason = "forecast"
          if node_pool_result == "scale-down":
             if "node_pool_contract_cpu" in locals():
                node_pool_result_reason = "cpu"
@@ -383,45 +1756,346 @@ def do(signer):
       if "node_pool_result" in locals():
          # scale-up..
          if node_pool_result_reason == "unschedulable-pods":
-            result_dict = {'success': {'action': node_pool_result, 'reason': node_pool_result_reason, 'unschedulable-pods-count': str(unsched_pods_val), 'node-pool-name': node_pool_name, 'node-pool-status': node_pool_status, 'node-count': str(node_pool_new_size)}}
-            result = json.dumps(result_dict)
+            result_dict = {'success': {'action': node_pool_result, 'reason': node_pool_result_reason, 'unschedulable-pods-count': str(unsched_pods_val), 'node-pool-name': node_pool_name, 'node-pool-status': node_pool_status, 'node-count': str(node_pool_new_size), 'work-request-id': work_request_id}}
+         # pre-scale..
+         elif node_pool_result_reason == "forecast":
+            result_dict = {'success': {'action': node_pool_result, 'reason': node_pool_result_reason, 'forecast-demand': str(round(node_pool_forecast_demand, 2)), 'node-pool-name': node_pool_name, 'node-pool-status': node_pool_status, 'node-count': str(node_pool_new_size), 'work-request-id': work_request_id}}
          else:
             # scale-down..
-            result_dict = {'success': {'action': node_pool_result, 'reason': node_pool_result_reason, 'node-pool-name': node_pool_name, 'node-pool-status': node_pool_status, 'node-count': str(node_pool_new_size)}}
-            result = json.dumps(result_dict)
+            result_dict = {'success': {'action': node_pool_result, 'reason': node_pool_result_reason, 'node-pool-name': node_pool_name, 'node-pool-status': node_pool_status, 'node-count': str(node_pool_new_size), 'nodes': [node['name'] for node in deleted_nodes], 'work-request-ids': work_request_ids,
+                                       'drain-failed-nodes': [outcome['node'] for outcome in drain_outcomes if outcome['status'] != "drained"],
+                                       'delete-failed-nodes': [node['name'] for node in drained_nodes if node not in deleted_nodes]}}
       else:
          # no scale-up: node_pool_max_size..
          if unsched_pods_val > 0:
             if node_pool_init_size == node_pool_max_size:
                result_dict = {'warning': {'action': 'none', 'reason': 'node-max-limit-reached', 'unschedulable-pods-count': str(unsched_pods_val), 'node-pool-name': node_pool_name, 'node-pool-status': node_pool_status, 'node-count': str(node_pool_init_size)}}
-               result = json.dumps(result_dict)
          # no action: node_pool_stability..
          if node_pool_stability == "stabilizing":
             result_dict = {'success': {'action': 'none', 'reason': 'node-pool-status', 'node-pool-name': node_pool_name, 'node-pool-status': node_pool_stability, 'unschedulable-pods-count': str(unsched_pods_val), 'node-count': str(node_pool_init_size)}}
-            result = json.dumps(result_dict)
+         # no scale-down: drain failed..
+         if "drain_outcome" in locals():
+            result_dict = {'warning': {'action': 'none', 'reason': 'drain-failed', 'node-pool-name': node_pool_name, 'node-pool-status': node_pool_status, 'node-count': str(node_pool_init_size),
+                                       'node': drain_outcome['node'], 'evicted-pods-count': str(len(drain_outcome['evicted'])), 'blocked-pods-count': str(len(drain_outcome['blocked'])),
+                                       'timed-out-pods-count': str(len(drain_outcome['timed-out'])), 'failed-pods-count': str(len(drain_outcome['failed']))}}
+         # no scale-down: node pods protected by pod disruption budgets..
+         if "scale_down_node" in locals() and scale_down_node['blocking-pdbs']:
+            result_dict = {'warning': {'action': 'none', 'reason': 'disruption-budget', 'node-pool-name': node_pool_name, 'node-pool-status': node_pool_status, 'node-count': str(node_pool_init_size),
+                                       'node': scale_down_node['name'], 'pod-disruption-budgets': scale_down_node['blocking-pdbs']}}
          # no action: node_pool_status..
          if node_pool_status == "updating":
             result_dict = {'success': {'action': 'none', 'reason': 'node-pool-updating', 'node-pool-name': node_pool_name, 'node-pool-status': node_pool_status, 'node-count': str(node_pool_init_size)}}
-            result = json.dumps(result_dict)
          # no action..
          if unsched_pods_val == 0:
-            if node_pool_status != "updating":
+            if node_pool_status != "updating" and "drain_outcome" not in locals() and "scale_down_node" not in locals():
                result_dict = {'success': {'action': 'none', 'reason': 'no-resource-pressure', 'node-pool-name': node_pool_name, 'node-pool-status': node_pool_status, 'node-count': str(node_pool_init_size)}}
-               result = json.dumps(result_dict)
-
+               # no scale-down: forecast demand..
+               if "node_pool_contract_deferred" in locals():
+                  result_dict = {'success': {'action': 'none', 'reason': 'forecast-demand', 'forecast-demand': str(round(node_pool_forecast_demand, 2)), 'node-pool-name': node_pool_name, 'node-pool-status': node_pool_status, 'node-count': str(node_pool_init_size)}}
       #   - log nodes_data dict details..
-      logging.info('Nodes: ' + json.dumps(nodes_data, indent = 4))
+      log_json('Nodes: ', nodes_data)
 
       #   - log result..
-      logging.info('Result: ' + json.dumps(result_dict, indent = 4))
+      logging.info('Result: ' + json.dumps(result_dict))
 
    else:
       # exit if missing external / user-defined variables..
       #   - define function response data..
       result_dict = {'error': {'reason': 'missing-input-data'}}
-      result = json.dumps(result_dict)
 
       #   - log result..
-      logging.info('Result: ' + json.dumps(result_dict, indent = 4))
+      logging.info('Result: ' + json.dumps(result_dict))
+
+   return result_dict
+
+def evaluate_node_pool_isolated(signer, pool_config, shared):
+   """
+   evaluate_node_pool_isolated
+   Evaluate a node pool from a multi node pool configuration, returning an error result rather than
+   raising where the evaluation fails - so that one failing node pool does not abort the others.
+   Authentication failures are raised, so that the signer & cache shared by all node pools are rebuilt once.
+   Node pool configuration variables not present in pool_config are taken from the function configuration.
+   """
+   config = dict(os.environ)
+   config.update(pool_config)
+   node_pool_id = config.get('node_pool_id')
+   try:
+      result_dict = evaluate_node_pool(signer, config, shared)
+   except DeadlineExceeded as e:
+      result_dict = deadline_exceeded_result(e)
+   except Exception as e:
+      if is_auth_error(e):
+         raise
+      logging.exception("Node pool evaluation failed: " + str(node_pool_id))
+      result_dict = {'error': {'reason': 'node-pool-evaluation-failed', 'detail': str(e)}}
+
+   for result_data in result_dict.values():
+      result_data['node-pool-id'] = node_pool_id
+
+   return result_dict
+
+def deadline_exceeded_result(e):
+   """
+   deadline_exceeded_result
+   Returns the result of a node pool evaluation cut short by the invocation deadline.
+   """
+   logging.warning("Node pool evaluation cut short: " + str(e))
+
+   return {'warning': {'action': 'none', 'reason': 'deadline-exceeded', 'detail': str(e)}}
+
+def do(signer, deadline=None, timeout=None):
+   """
+   do
+   Evaluate the node pool configured by the function configuration variables or, where the
+   node_pools variable is defined, each node pool in the JSON list of node pool configurations.
+   Node pools are evaluated concurrently, sharing api clients, credentials & pod listings.
+   No api calls are started or retried after the deadline, by default that of an invocation started now,
+   set from the invocation's timeout - by default the function timeout.
+   """
+   start = time.monotonic()
+   reset_timings()
+   set_deadline(deadline or get_deadline(start, timeout), timeout)
+   shared = {'lock': threading.Lock(), 'locks': {}, 'values': {}}
+   try:
+      if 'node_pools' in os.environ:
+         pool_configs = json.loads(os.environ['node_pools'])
+         node_pools_concurrency = int(os.environ.get('node_pools_concurrency', 4))
+         with ThreadPoolExecutor(max_workers=node_pools_concurrency) as executor:
+            results = list(executor.map(lambda pool_config: evaluate_node_pool_isolated(signer, pool_config, shared), pool_configs))
+         result_dict = {'node-pools': results}
+      else:
+         try:
+            result_dict = evaluate_node_pool(signer, os.environ, shared)
+         except DeadlineExceeded as e:
+            result_dict = deadline_exceeded_result(e)
+   finally:
+      # timings are published after the deadline..
+      set_deadline(None)
+
+   #   - report warm container cache usage..
+   result_dict['cache'] = dict(cache_stats)
+
+   #   - report phase timings, api calls & retries..
+   result_dict['timings'] = get_timings(time.monotonic() - start)
+   if os.environ.get('metrics_compartment_id'):
+      #   - publish as custom metrics, where configured..
+      try:
+         publish_timings(signer, os.environ['metrics_compartment_id'], os.environ.get('metrics_namespace', "oke_autoscaler"), result_dict['timings'])
+      except Exception as e:
+         logging.warning("Failed to publish timings: " + str(e))
+   result = json.dumps(result_dict)
 
    return result
+
+# oke-autoscaler daemon mode..
+def get_pool_configs():
+   """
+   get_pool_configs
+   Returns the list of node pool configurations, from the node_pools variable where defined,
+   otherwise a single node pool configured by the function configuration variables.
+   """
+   if 'node_pools' in os.environ:
+      return json.loads(os.environ['node_pools'])
+
+   return [{}]
+
+def get_daemon_signer():
+   """
+   get_daemon_signer
+   Get the signer used by the daemon, as configured by the daemon_auth variable: instance_principal
+   (default), resource_principal or config (the oci cli configuration file).
+   """
+   daemon_auth = os.environ.get('daemon_auth', "instance_principal")
+   if daemon_auth == "resource_principal":
+      return oci.auth.signers.get_resource_principals_signer()
+   if daemon_auth == "config":
+      oci_config = oci.config.from_file()
+      return oci.signer.Signer.from_config(oci_config)
+
+   return oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
+
+def update_unsched_index(index, event_type, pod):
+   """
+   update_unsched_index
+   Apply a pod watch event to the index of unschedulable pods, keyed by nodeSelector name then pod uid.
+   Returns the nodeSelector name where the event adds unschedulable pods to a previously empty entry.
+   """
+   node_selector = (pod.get('spec') or {}).get('nodeSelector') or {}
+   node_pool_name = node_selector.get('name')
+   uid = pod['metadata']['uid']
+   pods = index.setdefault(node_pool_name, {})
+   if event_type != "DELETED" and is_unsched_pod(pod):
+      new_pressure = not pods
+      pods[uid] = pod
+      if new_pressure:
+         return node_pool_name
+   else:
+      pods.pop(uid, None)
+
+   return None
+
+def watch_unsched_pods(signer, cluster, stop, watch_timeout):
+   """
+   watch_unsched_pods
+   Maintain the cluster's index of unschedulable pods from a watch on Pending pods, resuming the watch
+   from the last resourceVersion seen and relisting where the resourceVersion has expired.
+   Sets the cluster's pressure event, recording the time first seen, when new unschedulable pods appear.
+   """
+   resource_version = None
+   backoff = 1
+   while not stop.is_set():
+      try:
+         kube_api = get_cluster_kube_api(get_client(signer, oci.container_engine.ContainerEngineClient),
+                                         get_client(signer, oci.secrets.SecretsClient),
+                                         cluster['cluster_id'], cluster['secret_id'])
+         #   - (re)list pending pods, replacing the index..
+         if resource_version is None:
+            index = {}
+            for pod_list in list_pending_pods(kube_api):
+               for pod in pod_list.get('items') or []:
+                  update_unsched_index(index, "ADDED", pod)
+               resource_version = pod_list['metadata'].get('resourceVersion')
+            with cluster['lock']:
+               cluster['index'] = index
+            if any(index.values()):
+               cluster['pressure_time'] = cluster['pressure_time'] or time.monotonic()
+               cluster['pressure'].set()
+
+         #   - watch for changes..
+         for event in kube_watch(kube_api, "/api/v1/pods", {'fieldSelector': 'status.phase=Pending', 'resourceVersion': resource_version}, watch_timeout):
+            if event['type'] == "ERROR":
+               if event['object'].get('code') == 410:
+                  # resourceVersion expired, relist..
+                  resource_version = None
+               break
+            resource_version = event['object']['metadata'].get('resourceVersion', resource_version)
+            if event['type'] == "BOOKMARK":
+               continue
+            with cluster['lock']:
+               new_pressure = update_unsched_index(cluster['index'], event['type'], event['object'])
+            if new_pressure is not None:
+               logging.info("Unschedulable Pods: " + cluster['cluster_id'] + ": " + str(new_pressure))
+               cluster['pressure_time'] = cluster['pressure_time'] or time.monotonic()
+               cluster['pressure'].set()
+            if stop.is_set():
+               return
+         backoff = 1
+      except Exception as e:
+         if isinstance(e, urllib.error.HTTPError) and e.code == 410:
+            resource_version = None
+         elif is_auth_error(e):
+            invalidate_cache()
+         logging.info("Pod watch failed: " + cluster['cluster_id'] + ": " + str(e))
+         stop.wait(backoff)
+         backoff = min(backoff * 2, 60)
+
+   return
+
+def has_unsched_pods(clusters, pool_config, node_pool_name):
+   """
+   has_unsched_pods
+   Determine if the cluster index holds unschedulable pods for a node pool. Node pools not yet evaluated
+   (node pool name not known) are considered to have unschedulable pods where any exist in the cluster.
+   """
+   cluster = clusters[dict(os.environ, **pool_config)['cluster_id']]
+   with cluster['lock']:
+      if node_pool_name is None:
+         return any(cluster['index'].values())
+      return bool(cluster['index'].get(node_pool_name))
+
+def run_daemon(signer, stop=None, on_result=None):
+   """
+   run_daemon
+   Run the autoscaler as a long-running process. Node pools are evaluated for scale-up within seconds of
+   unschedulable pods appearing (after a debounce period, to collect a burst of pods), as reported by a
+   watch on each cluster's Pending pods. Node pools are also evaluated for scale-down on a timer.
+   on_result is called with each evaluation result, and the time from pod event to decision (or None).
+   """
+   stop = stop or threading.Event()
+   pool_configs = get_pool_configs()
+   daemon_debounce = float(os.environ.get('daemon_debounce', 5))
+   daemon_recheck_interval = float(os.environ.get('daemon_recheck_interval', 30))
+   daemon_eval_interval = float(os.environ.get('daemon_eval_interval', 60 * int(os.environ.get('node_pool_eval_window', 3))))
+   daemon_watch_timeout = int(os.environ.get('daemon_watch_timeout', 300))
+
+   #   - watch the pending pods in each cluster..
+   clusters = {}
+   pressure = threading.Event()
+   for pool_config in pool_configs:
+      config = dict(os.environ, **pool_config)
+      if config['cluster_id'] not in clusters:
+         clusters[config['cluster_id']] = {'cluster_id': config['cluster_id'], 'secret_id': config['secret_id'], 'index': {},
+                                           'lock': threading.Lock(), 'pressure': pressure, 'pressure_time': None}
+   for cluster in clusters.values():
+      threading.Thread(target=watch_unsched_pods, args=(signer, cluster, stop, daemon_watch_timeout), daemon=True).start()
+
+   #   - wake the evaluation loop where stopped..
+   def wake_on_stop():
+      stop.wait()
+      pressure.set()
+   threading.Thread(target=wake_on_stop, daemon=True).start()
+
+   node_pool_names = {}
+   last_evaluation = {}
+   next_eval = time.monotonic()
+   while not stop.is_set():
+      # wait for unschedulable pods, a pending re-check or the scale-down timer..
+      pending_pools = [i for i in range(len(pool_configs)) if has_unsched_pods(clusters, pool_configs[i], node_pool_names.get(i))]
+      wait_until = next_eval
+      if pending_pools:
+         wait_until = min(wait_until, min(last_evaluation.get(i, 0) + daemon_recheck_interval for i in pending_pools))
+      triggered = pressure.wait(max(wait_until - time.monotonic(), 0))
+      if triggered:
+         stop.wait(daemon_debounce)
+         pressure.clear()
+      if stop.is_set():
+         break
+
+      now = time.monotonic()
+      scheduled_eval = now >= next_eval
+      if scheduled_eval:
+         next_eval = now + daemon_eval_interval
+      evaluate_pools = [i for i in range(len(pool_configs))
+                        if scheduled_eval or (has_unsched_pods(clusters, pool_configs[i], node_pool_names.get(i)) and (triggered or now - last_evaluation.get(i, 0) >= daemon_recheck_interval))]
+      if not evaluate_pools:
+         continue
+
+      # evaluate node pools, using the indexed unschedulable pods rather than listing pods..
+      shared = {'lock': threading.Lock(), 'locks': {}, 'values': {}}
+      pressure_times = {}
+      for cluster in clusters.values():
+         with cluster['lock']:
+            shared['values']['unsched_pods:' + cluster['cluster_id']] = [pod for pods in cluster['index'].values() for pod in pods.values()]
+         pressure_times[cluster['cluster_id']] = cluster['pressure_time']
+         cluster['pressure_time'] = None
+      node_pools_concurrency = int(os.environ.get('node_pools_concurrency', 4))
+      try:
+         with ThreadPoolExecutor(max_workers=node_pools_concurrency) as executor:
+            results = list(executor.map(lambda i: evaluate_node_pool_isolated(signer, pool_configs[i], shared), evaluate_pools))
+      except Exception as e:
+         if not is_auth_error(e):
+            raise
+         # cached credentials rejected, rebuild & re-evaluate..
+         logging.info("Authentication error, invalidating cache: " + str(e))
+         invalidate_cache()
+         for cluster in clusters.values():
+            cluster['pressure_time'] = cluster['pressure_time'] or pressure_times[cluster['cluster_id']]
+         stop.wait(daemon_debounce)
+         continue
+      for i, result_dict in zip(evaluate_pools, results):
+         last_evaluation[i] = time.monotonic()
+         result_data = list(result_dict.values())[0]
+         if 'node-pool-name' in result_data:
+            node_pool_names[i] = result_data['node-pool-name']
+         pressure_time = pressure_times[dict(os.environ, **pool_configs[i])['cluster_id']]
+         decision_latency = last_evaluation[i] - pressure_time if pressure_time else None
+         logging.info("Result: " + json.dumps(result_dict) + ", Decision Latency: " + str(decision_latency))
+         if on_result:
+            on_result(result_dict, decision_latency)
+
+   return
+
+if __name__ == "__main__":
+   # run as a long-running daemon, e.g. python3 func.py daemon..
+   if sys.argv[1:] == ["daemon"]:
+      run_daemon(get_daemon_signer())